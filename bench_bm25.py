@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+📊 مقارنة سرعة الاسترجاع: rank_bm25.BM25Okapi مقابل الفهرس المقلوب المضغوط (src/rag/inverted.py)
+
+مدونة اصطناعية بتوزيع Zipf للكلمات (مثل النصوص الحقيقية: كلمات شائعة بقوائم طويلة
+وكلمات نادرة بقوائم قصيرة). لكل حجم: زمن البناء، حجم الفهرس، زمن الاستعلام (p50/p95)،
+وتطابق أفضل k مع التقييم الكامل.
+
+    python bench_bm25.py
+    python bench_bm25.py --sizes 10000,100000,1000000 --okapi-max 100000
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from src.rag.inverted import InvertedIndex  # noqa: E402
+
+
+def make_corpus(n_docs: int, vocab_size: int, doc_len: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    p = 1.0 / np.arange(1, vocab_size + 1)
+    p /= p.sum()
+    lens = rng.integers(doc_len // 2, doc_len * 3 // 2, size=n_docs)
+    ids = rng.choice(vocab_size, size=int(lens.sum()), p=p)
+    out, pos = [], 0
+    for L in lens:
+        out.append([vocab[i] for i in ids[pos:pos + L]])
+        pos += L
+    return out, vocab, p
+
+
+def make_queries(n: int, vocab, p, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    # أسئلة واقعية: 2-5 كلمات من نفس توزيع المدونة
+    return [[vocab[i] for i in rng.choice(len(vocab), size=int(rng.integers(2, 6)), p=p)] for _ in range(n)]
+
+
+def pct(xs, q):
+    return float(np.percentile(np.asarray(xs) * 1000, q))
+
+
+def bench(n_docs: int, args):
+    print(f"\n=== {n_docs:,} مقطع ===")
+    t = time.perf_counter()
+    docs, vocab, p = make_corpus(n_docs, args.vocab, args.doc_len)
+    print(f"توليد المدونة: {time.perf_counter() - t:.1f}s")
+    queries = make_queries(args.queries, vocab, p)
+
+    t = time.perf_counter()
+    inv = InvertedIndex.build(docs)
+    print(f"[inverted] بناء: {time.perf_counter() - t:.1f}s  حجم المصفوفات: {inv.nbytes() / 1e6:.1f} MB")
+    lat, exact = [], 0
+    for q in queries:
+        t = time.perf_counter()
+        top = inv.top_k(q, args.k)
+        lat.append(time.perf_counter() - t)
+        if args.verify:
+            ex = inv.scores_exhaustive(q)
+            ref = np.sort(ex)[::-1][:args.k]
+            exact += int(np.allclose([s for _, s in top], ref[:len(top)], rtol=1e-4))
+    print(f"[inverted] استعلام p50={pct(lat, 50):.2f}ms p95={pct(lat, 95):.2f}ms"
+          + (f"  تطابق top-{args.k} مع التقييم الكامل: {exact}/{len(queries)}" if args.verify else ""))
+
+    if n_docs > args.okapi_max:
+        print(f"[BM25Okapi] تخطّي (> --okapi-max={args.okapi_max:,}؛ يحتاج قاموسًا لكل مقطع في الذاكرة)")
+        return
+    try:
+        from rank_bm25 import BM25Okapi
+    except Exception:
+        print("[BM25Okapi] rank_bm25 غير مثبت")
+        return
+    t = time.perf_counter()
+    okapi = BM25Okapi(docs)
+    print(f"[BM25Okapi] بناء: {time.perf_counter() - t:.1f}s")
+    lat = []
+    for q in queries[: max(5, len(queries) // 4)]:
+        t = time.perf_counter()
+        scores = okapi.get_scores(q)
+        np.argsort(scores)[::-1][:args.k]
+        lat.append(time.perf_counter() - t)
+    print(f"[BM25Okapi] استعلام p50={pct(lat, 50):.2f}ms p95={pct(lat, 95):.2f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--vocab", type=int, default=50000)
+    ap.add_argument("--doc-len", type=int, default=60)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--okapi-max", type=int, default=100000)
+    ap.add_argument("--no-verify", dest="verify", action="store_false")
+    args = ap.parse_args()
+    for n in (int(s) for s in args.sizes.split(",")):
+        bench(n, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+📊 تقرير الدقة مقابل الذاكرة لترميزات الفهرس الدلالي (src/rag/indexer.py)
+
+لكل (نوع، ترميز): حجم الفهرس، بايت لكل مقطع، كم مقطعًا يتسع في ميزانية --budget-mb،
+recall@k مقارنة بالبحث الدقيق float32، وزمن الاستعلام (p50/p95).
+
+المتجهات: من كاش التضمين الحقيقي (cache/rag_dense/embeddings.sqlite) إن وُجد — الأدق
+لاختيار إعداد النشر — وإلا متجهات اصطناعية متجمّعة بنفس البُعد (384).
+
+    python bench_dense.py
+    python bench_dense.py --n 200000 --configs flat/f32,flat/sq8,ivf/pq --budget-mb 256
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import faiss  # noqa: E402
+from src.rag import indexer  # noqa: E402
+from src.rag.embed_cache import EMB_DB  # noqa: E402
+
+
+def load_vectors(args):
+    if os.path.exists(args.emb_db) and not args.synthetic:
+        con = sqlite3.connect(args.emb_db)
+        rows = con.execute("SELECT v FROM emb WHERE model=? LIMIT ?", (args.model, args.n)).fetchall()
+        if len(rows) >= 1000:
+            X = np.stack([np.frombuffer(v, dtype=np.float32) for (v,) in rows])
+            return X, f"كاش التضمين ({args.emb_db})"
+    rng = np.random.default_rng(3)
+    centers = rng.standard_normal((max(16, args.n // 500), args.dim)).astype(np.float32)
+    X = centers[rng.integers(0, len(centers), args.n)] + 0.35 * rng.standard_normal((args.n, args.dim)).astype(np.float32)
+    faiss.normalize_L2(X)
+    return X, "اصطناعية متجمّعة"
+
+
+def make_queries(X, n, seed=5):
+    rng = np.random.default_rng(seed)
+    Q = X[rng.integers(0, len(X), n)] + 0.05 * rng.standard_normal((n, X.shape[1])).astype(np.float32)
+    faiss.normalize_L2(Q)
+    return np.ascontiguousarray(Q, dtype=np.float32)
+
+
+def pct(xs, q):
+    return float(np.percentile(np.asarray(xs) * 1000, q))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--configs", default="flat/f32,flat/sq8,flat/pq,ivf/f32,ivf/sq8,ivf/pq,hnsw/f32,hnsw/sq8")
+    ap.add_argument("--budget-mb", type=float, default=256)
+    ap.add_argument("--emb-db", default=EMB_DB)
+    ap.add_argument("--model", default=indexer.MODEL_NAME)
+    ap.add_argument("--synthetic", action="store_true")
+    args = ap.parse_args()
+
+    X, src = load_vectors(args)
+    n, dim = X.shape
+    Q = make_queries(X, args.queries)
+    print(f"{n:,} متجه × {dim} ({src})، {len(Q)} سؤال، k={args.k}")
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(X)
+    _, ref = exact.search(Q, args.k)
+
+    ids = np.arange(n, dtype=np.int64)
+    print(f"\n{'النوع/الترميز':<14}{'factory':<22}{'الحجم MB':>10}{'B/مقطع':>9}{'يتسع':>12}{'recall':>8}{'p50 ms':>8}{'p95 ms':>8}")
+    for cfg in args.configs.split(","):
+        kind, codec = cfg.split("/")
+        t = time.perf_counter()
+        index, kind_b, codec_b = indexer._new_index(kind, codec, X)
+        index.add_with_ids(X, ids)
+        build = time.perf_counter() - t
+        indexer._tune(index, kind_b)
+        size = len(faiss.serialize_index(index))
+        lat, found = [], 0
+        for i in range(len(Q)):
+            t = time.perf_counter()
+            _, I = index.search(Q[i:i + 1], args.k)
+            lat.append(time.perf_counter() - t)
+            found += len(set(I[0].tolist()) & set(ref[i].tolist()))
+        recall = found / (len(Q) * args.k)
+        per = size / n
+        fits = int(args.budget_mb * 1024 * 1024 / per)
+        spec = indexer.index_spec(kind, codec, n, dim)[2]
+        label = f"{kind_b}/{codec_b}" + ("" if (kind_b, codec_b) == (kind, codec) else "*")
+        print(f"{label:<14}{spec:<22}{size / 1e6:>10.1f}{per:>9.0f}{fits:>12,}{recall:>8.3f}{pct(lat, 50):>8.2f}{pct(lat, 95):>8.2f}"
+              f"   (بناء {build:.1f}s)")
+    print(f"\n* = استُبدل الترميز (pq يحتاج ≥{indexer.PQ_MIN_TRAIN:,} مقطع و hnsw بلا pq). "
+          f"'يتسع' = عدد المقاطع في {args.budget_mb:g} MB.")
+
+
+if __name__ == "__main__":
+    main()
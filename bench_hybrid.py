@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+📊 الاسترجاع الهجين (src/rag/hybrid.py): زمن ودقة إعادة ترتيب مرشحي BM25 بالتضمين المحفوظ
+
+مدونة اصطناعية بمواضيع: كل مقطع = كلمات من موضوعه + كلمات عامة بتوزيع Zipf،
+وتضمينه = متوسط متجهات كلماته (فيرتبط BM25 والتضمين كما في الواقع دون تطابق تام).
+المتجهات تُخزَّن في كاش تضمين SQLite مؤقت وتُقرأ منه كما في الخدمة.
+
+لكل حجم مدونة وعدد مرشحين: زمن الهجين (p50/p95) مقابل البحث الدلالي الكامل،
+و recall@k لترتيب التضمين داخل المرشحين مقارنة بالبحث الدلالي الكامل على كل المدونة.
+
+    python bench_hybrid.py
+    python bench_hybrid.py --sizes 10000,100000 --candidates 50,100,200,500
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("RAG_EMB_DB", os.path.join(tempfile.mkdtemp(prefix="bench_hybrid_"), "emb.sqlite"))
+from src.rag import embed_cache  # noqa: E402
+from src.rag.hybrid import fuse, dense_scores  # noqa: E402
+from src.rag.inverted import InvertedIndex  # noqa: E402
+
+MODEL = "bench-synthetic"
+
+
+def make_corpus(n_docs, args, seed=7):
+    rng = np.random.default_rng(seed)
+    V = args.vocab
+    W = rng.standard_normal((V, args.dim)).astype(np.float32)
+    W /= np.linalg.norm(W, axis=1, keepdims=True)
+    zipf = 1.0 / np.arange(1, V + 1)
+    zipf /= zipf.sum()
+    topics = [rng.choice(V, size=300, replace=False) for _ in range(args.topics)]
+    doc_topic = rng.integers(0, args.topics, n_docs)
+    toks, X = [], np.empty((n_docs, args.dim), dtype=np.float32)
+    general = rng.choice(V, size=(n_docs, args.doc_len // 2), p=zipf)
+    for d in range(n_docs):
+        ids = np.concatenate([rng.choice(topics[doc_topic[d]], args.doc_len // 2), general[d]])
+        toks.append([f"w{i}" for i in ids])
+        v = W[ids].mean(axis=0)
+        X[d] = v / np.linalg.norm(v)
+    return toks, X, W, topics, doc_topic
+
+
+def make_queries(n, toks, W, topics, doc_topic, seed=11):
+    rng = np.random.default_rng(seed)
+    out = []
+    for d in rng.integers(0, len(toks), n):
+        ids = rng.choice(topics[doc_topic[d]], int(rng.integers(2, 6)))
+        v = W[ids].mean(axis=0)
+        out.append(([f"w{i}" for i in ids], (v / np.linalg.norm(v)).astype(np.float32)))
+    return out
+
+
+def pct(xs, q):
+    return float(np.percentile(np.asarray(xs) * 1000, q))
+
+
+def bench(n_docs, args):
+    print(f"\n=== {n_docs:,} مقطع ===")
+    toks, X, W, topics, doc_topic = make_corpus(n_docs, args)
+    texts = [" ".join(t) for t in toks]
+    bm25 = InvertedIndex.build(toks)
+    vec_of = dict(zip(texts, X))
+    for i in range(0, n_docs, 5000):
+        embed_cache.encode_chunks(MODEL, texts[i:i + 5000], lambda m, ts: np.stack([vec_of[t] for t in ts]))
+    keys = [embed_cache.content_key(t) for t in texts]
+    queries = make_queries(args.queries, toks, W, topics, doc_topic)
+
+    lat, ref = [], []
+    for _, q in queries:
+        t = time.perf_counter()
+        s = X @ q
+        top = np.argpartition(-s, args.k)[:args.k]
+        lat.append(time.perf_counter() - t)
+        ref.append(set(top.tolist()))
+    print(f"[دلالي كامل] p50={pct(lat, 50):.2f}ms p95={pct(lat, 95):.2f}ms  (مصفوفة {X.nbytes / 1e6:.0f} MB في الذاكرة)")
+
+    for c in (int(x) for x in args.candidates.split(",")):
+        lat, rec_dense, rec_fused = [], 0, 0
+        for (qt, q), r in zip(queries, ref):
+            t = time.perf_counter()
+            cands = bm25.top_k(qt, c)
+            ids = [i for i, _ in cands]
+            known = embed_cache.lookup(MODEL, [keys[i] for i in ids])
+            dense = dense_scores(q, [known.get(keys[i]) for i in ids])
+            fused = fuse(len(ids), dense, args.k)
+            lat.append(time.perf_counter() - t)
+            order = np.argsort(-np.nan_to_num(dense, nan=-9))[:args.k]
+            rec_dense += len({ids[j] for j in order} & r)
+            rec_fused += len({ids[j] for j, _ in fused} & r)
+        tot = len(queries) * args.k
+        print(f"[هجين {c:>4} مرشح] p50={pct(lat, 50):.2f}ms p95={pct(lat, 95):.2f}ms  "
+              f"recall@{args.k}: إعادة ترتيب={rec_dense / tot:.3f} دمج RRF={rec_fused / tot:.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--candidates", default="50,100,200,500")
+    ap.add_argument("--vocab", type=int, default=30000)
+    ap.add_argument("--topics", type=int, default=300)
+    ap.add_argument("--doc-len", type=int, default=60)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("-k", type=int, default=10)
+    args = ap.parse_args()
+    print(f"كاش التضمين: {embed_cache.EMB_DB}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        bench(n, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+⏱️ تقرير زمن الاستيراد عند الإقلاع — بسام الذكي
+
+يشغّل `python -X importtime -c "import main"` ويجمع الزمن التراكمي لكل حزمة عليا.
+للمقارنة قبل/بعد: --baseline <git-rev> يقيس نفس الشيء على نسخة أخرى من المستودع
+(عبر git worktree مؤقت) ويعرض الفرق.
+
+    python check_import_time.py
+    python check_import_time.py --baseline HEAD~1 --top 15
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+import tempfile
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(cwd: str, target: str = "main", runs: int = 3):
+    """أقل زمن (ميكروثانية) من عدة تشغيلات، لكل حزمة عليا + الإجمالي"""
+    best_total, best_pkgs = None, {}
+    for _ in range(runs):
+        p = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=cwd, capture_output=True, text=True,
+            env={**os.environ, "WARMUP": "0", "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        pkgs, total = {}, 0
+        for line in p.stderr.splitlines():
+            m = _LINE.match(line)
+            if not m:
+                continue
+            cumulative, indent, name = int(m.group(2)), len(m.group(3)), m.group(4)
+            if indent == 1:  # استيراد من المستوى الأعلى (حزمة كاملة بتوابعها)
+                top = name.split(".")[0]
+                pkgs[top] = pkgs.get(top, 0) + cumulative
+                total += cumulative
+        if p.returncode != 0:
+            print(f"⚠️ import {target} فشل في {cwd}:\n{p.stderr.strip().splitlines()[-1]}")
+        if best_total is None or total < best_total:
+            best_total, best_pkgs = total, pkgs
+    return best_total or 0, best_pkgs
+
+
+def _worktree(rev: str) -> str:
+    path = tempfile.mkdtemp(prefix="bassam-importtime-")
+    subprocess.run(["git", "worktree", "add", "--detach", path, rev], check=True, capture_output=True)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--baseline", help="git rev للمقارنة (مثال: HEAD~1)")
+    ap.add_argument("--target", default="main")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=12)
+    args = ap.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    total, pkgs = measure(here, args.target, args.runs)
+
+    base_total, base_pkgs = None, {}
+    if args.baseline:
+        wt = _worktree(args.baseline)
+        try:
+            base_total, base_pkgs = measure(wt, args.target, args.runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", wt], capture_output=True)
+
+    names = sorted(set(pkgs) | set(base_pkgs), key=lambda n: -max(pkgs.get(n, 0), base_pkgs.get(n, 0)))
+    print(f"\n⏱️ import {args.target} (أفضل {args.runs} تشغيلات، بالميلي ثانية)")
+    if base_total is not None:
+        print(f"{'package':<24}{'before':>10}{'after':>10}{'diff':>10}")
+        for n in names[:args.top]:
+            b, a = base_pkgs.get(n, 0) / 1000, pkgs.get(n, 0) / 1000
+            print(f"{n:<24}{b:>10.1f}{a:>10.1f}{a - b:>+10.1f}")
+        print(f"{'TOTAL':<24}{base_total / 1000:>10.1f}{total / 1000:>10.1f}{(total - base_total) / 1000:>+10.1f}")
+    else:
+        print(f"{'package':<24}{'ms':>10}")
+        for n in names[:args.top]:
+            print(f"{n:<24}{pkgs.get(n, 0) / 1000:>10.1f}")
+        print(f"{'TOTAL':<24}{total / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
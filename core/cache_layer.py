@@ -1,43 +1,189 @@
 # core/cache_layer.py
+# كاش بطبقتين مشترك لكل التطبيق:
+#   L1: LRU داخل العملية، محدود بعدد العناصر وبالبايتات، ويحترم انتهاء الصلاحية
+#   L2: diskcache على القرص (اختياري) بميزانية قرص واحدة للجميع
+# كل وحدة تأخذ "مساحة أسماء" خاصة بها: cache.namespace("omni") ... ولكل مساحة إحصاءاتها.
 from __future__ import annotations
-import time
-from typing import Any, Optional
+import os, sys, time, pickle, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+CACHE_DIR = os.getenv("CACHE_DIR", "./cache")
+CACHE_DISK_MB = int(os.getenv("OMNI_CACHE_MB", "256"))      # ميزانية القرص الكلية (L2)
+CACHE_MEM_ITEMS = int(os.getenv("CACHE_MEM_ITEMS", "2048"))  # أقصى عدد عناصر في L1
+CACHE_MEM_MB = int(os.getenv("CACHE_MEM_MB", "32"))          # أقصى حجم L1 بالميجابايت
 
 try:
     from diskcache import Cache  # اختياري
-    _dc = Cache("./cache")
+    _dc = Cache(CACHE_DIR, size_limit=CACHE_DISK_MB * 1024 * 1024)
 except Exception:
     _dc = None
 
+_NO_VALUE = object()
+
+
+def _sizeof(value: Any) -> int:
+    """تقدير حجم القيمة بالبايت (حجم pickle أقرب للواقع من getsizeof)"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "ignore"))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _NSStats:
+    __slots__ = ("l1_hits", "l2_hits", "misses", "sets", "evictions", "expired")
+
+    def __init__(self):
+        for k in self.__slots__:
+            setattr(self, k, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        total = self.l1_hits + self.l2_hits + self.misses
+        d["hit_rate"] = round((self.l1_hits + self.l2_hits) / total, 3) if total else 0.0
+        return d
+
+
+class _LRU:
+    """L1: OrderedDict مرتب من الأقدم استخدامًا للأحدث. العنصر = (قيمة، انتهاء، حجم، مساحة)"""
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._d: "OrderedDict[str, tuple]" = OrderedDict()
+        self._last_purge = 0.0
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def get(self, key: str, now: float):
+        item = self._d.get(key)
+        if item is None:
+            return _NO_VALUE, None
+        value, exp, size, ns = item
+        if exp and now > exp:
+            self.pop(key)
+            return _NO_VALUE, ns
+        self._d.move_to_end(key)
+        return value, ns
+
+    def pop(self, key: str) -> None:
+        item = self._d.pop(key, None)
+        if item is not None:
+            self.bytes -= item[2]
+
+    def set(self, key: str, value: Any, exp: float, size: int, ns: str, stats: Dict[str, _NSStats], now: float) -> None:
+        self.pop(key)
+        self._d[key] = (value, exp, size, ns)
+        self.bytes += size
+        if len(self._d) > self.max_items or self.bytes > self.max_bytes:
+            self._shrink(stats, now)
+
+    def _shrink(self, stats: Dict[str, _NSStats], now: float) -> None:
+        # أولاً: العناصر المنتهية (مسح كامل مرة كل ثانية على الأكثر)
+        if now - self._last_purge > 1.0:
+            self._last_purge = now
+            for k in [k for k, it in self._d.items() if it[1] and now > it[1]]:
+                ns = self._d[k][3]
+                self.pop(k)
+                stats[ns].expired += 1
+        # ثانيًا: الأقل استخدامًا مؤخرًا
+        while self._d and (len(self._d) > self.max_items or self.bytes > self.max_bytes):
+            k, (_, _, size, ns) = self._d.popitem(last=False)
+            self.bytes -= size
+            stats[ns].evictions += 1
+
+
+_L1 = _LRU(CACHE_MEM_ITEMS, CACHE_MEM_MB * 1024 * 1024)
+_STATS: Dict[str, _NSStats] = {}
+_LOCK = threading.RLock()
+
+
 class CacheLayer:
-    def __init__(self, default_ttl: int = 60 * 60):
+    """
+    ttl=None → default_ttl ، ttl=0 → بدون انتهاء.
+    القيم الأكبر من ثُمن ميزانية L1 تذهب إلى L2 فقط حتى لا تطرد كل شيء آخر.
+    """
+
+    def __init__(self, default_ttl: int = 60 * 60, namespace: str = "default"):
         self.default_ttl = default_ttl
-        self._mem = {}  # استخدام ذاكرة داخلية عند عدم توفر diskcache
+        self.ns = namespace
+        with _LOCK:
+            _STATS.setdefault(namespace, _NSStats())
+
+    def namespace(self, name: str, default_ttl: Optional[int] = None) -> "CacheLayer":
+        """مساحة أسماء منفصلة تشترك في نفس L1/L2 وميزانيتهما"""
+        return CacheLayer(self.default_ttl if default_ttl is None else default_ttl, namespace=name)
+
+    def _k(self, key: str) -> str:
+        return f"{self.ns}:{key}"
 
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        ttl = ttl or self.default_ttl
-        exp = time.time() + ttl
-        if _dc:
-            _dc.set(key, value, expire=ttl)
-        else:
-            self._mem[key] = (value, exp)
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        exp = now + ttl if ttl else 0.0
+        k = self._k(key)
+        size = _sizeof(value)
+        with _LOCK:
+            _STATS[self.ns].sets += 1
+            if size <= _L1.max_bytes // 8:
+                _L1.set(k, value, exp, size, self.ns, _STATS, now)
+            else:
+                _L1.pop(k)
+        if _dc is not None:
+            _dc.set(k, value, expire=ttl or None)
 
     def get(self, key: str, default: Any = None) -> Any:
-        if _dc:
-            val = _dc.get(key, default)
-            return val
-        item = self._mem.get(key)
-        if not item:
-            return default
-        val, exp = item
-        if exp and time.time() > exp:
-            self._mem.pop(key, None)
-            return default
-        return val
+        k = self._k(key)
+        now = time.time()
+        with _LOCK:
+            value, ns = _L1.get(k, now)
+            st = _STATS[self.ns]
+            if value is not _NO_VALUE:
+                st.l1_hits += 1
+                return value
+            if ns is not None:
+                st.expired += 1
+        if _dc is not None:
+            value, exp = _dc.get(k, default=_NO_VALUE, expire_time=True)
+            if value is not _NO_VALUE:
+                # قراءة عبر L1: العنصر التالي يُخدم من الذاكرة
+                size = _sizeof(value)
+                with _LOCK:
+                    st.l2_hits += 1
+                    if size <= _L1.max_bytes // 8:
+                        _L1.set(k, value, exp or 0.0, size, self.ns, _STATS, now)
+                return value
+        with _LOCK:
+            st.misses += 1
+        return default
 
     def delete(self, key: str) -> None:
-        if _dc:
-            _dc.delete(key)
-        self._mem.pop(key, None)
+        k = self._k(key)
+        with _LOCK:
+            _L1.pop(k)
+        if _dc is not None:
+            _dc.delete(k)
+
+
+def stats() -> Dict[str, Any]:
+    """إحصاءات لكل مساحة أسماء + حالة الطبقتين"""
+    with _LOCK:
+        out = {
+            "l1": {"items": len(_L1), "bytes": _L1.bytes, "max_items": _L1.max_items, "max_bytes": _L1.max_bytes},
+            "namespaces": {ns: st.as_dict() for ns, st in _STATS.items()},
+        }
+    if _dc is not None:
+        try:
+            out["l2"] = {"dir": CACHE_DIR, "bytes": _dc.volume(), "max_bytes": CACHE_DISK_MB * 1024 * 1024}
+        except Exception:
+            pass
+    return out
+
 
 cache = CacheLayer()
@@ -0,0 +1,148 @@
+# core/compute.py — مجمّع عمليات مشترك للحساب الثقيل (readability / bs4+lxml / sumy / SymPy)
+# core/executor.py يمنع تجمّد الـ event loop، لكن خيوطه كلها تتقاسم GIL واحدًا: تحليل HTML
+# وتلخيص LexRank/LSA وتبسيط SymPy تُشغّل نواة واحدة فقط مهما زادت الطلبات.
+#   - COMPUTE_WORKERS عملية (spawn، افتراضيًا 1) تبدأ مع أول مهمة: كل عامل يستورد COMPUTE_PRELOAD
+#     مرة واحدة عند بدئه؛ COMPUTE_WARM=1 يشغّلها في تسخين main.py بدل أول طلب
+#   - run(fn, *args, timeout=...) متزامن (من خيوط core/executor)، و arun للشيفرة غير المتزامنة
+#   - المهلة: المستدعي يتلقى ComputeTimeout؛ وإن علقت مهام بعدد العمال (SymPy بلا نهاية مثلًا)
+#     يُعاد إنشاء المجمّع وتُقتل عملياته
+#   - عامل مات (OOM مثلًا → BrokenProcessPool): يُعاد إنشاء المجمّع وتُنفَّذ المهمة مباشرة
+#   - COMPUTE_WORKERS=0: تنفيذ مباشر في الخيط المستدعي (كما كان)
+# fn يجب أن تكون دالة على مستوى وحدة (قابلة لـ pickle) ومعاملاتها نصوص/أرقام.
+from __future__ import annotations
+import os, functools, importlib, threading, time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as _FutTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+# عامل واحد افتراضيًا: os.cpu_count() يرى أنوية المضيف لا حصة الحاوية، وكل عامل يحمل COMPUTE_PRELOAD
+# (مئات الميجابايت) — على خطة 512MB أربعة عمال + الأب = OOM عند الإقلاع
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "1"))
+COMPUTE_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", "20"))
+MATH_TIMEOUT = float(os.getenv("MATH_TIMEOUT", "10"))  # SymPy قد لا ينتهي أبدًا مع مدخل عدائي
+COMPUTE_PRELOAD = tuple(m for m in os.getenv(
+    "COMPUTE_PRELOAD",
+    "readability,bs4,lxml.html,sumy.parsers.plaintext,sumy.nlp.tokenizers,"
+    "sumy.summarizers.lex_rank,sumy.summarizers.lsa,sympy",
+).split(",") if m.strip())
+
+
+class ComputeTimeout(TimeoutError):
+    """تجاوزت المهمة مهلتها — المستدعي يتابع بالبديل الأرخص"""
+
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_stuck: List = []
+_in_worker = False
+_stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "inline": 0, "recycled": 0, "broken": 0}
+
+
+def _init_worker(modules) -> None:
+    global _in_worker
+    _in_worker = True
+    for name in modules:
+        try:
+            importlib.import_module(name.strip())
+        except Exception:
+            pass
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if COMPUTE_WORKERS <= 0 or _in_worker:
+        return None
+    with _lock:
+        if _pool is None:
+            import multiprocessing as mp
+            _pool = ProcessPoolExecutor(COMPUTE_WORKERS, mp_context=mp.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(COMPUTE_PRELOAD,))
+        return _pool
+
+
+def _recycle(pool: ProcessPoolExecutor) -> None:
+    """يقتل مجمّعًا علقت كل عملياته ويترك التالي يُنشأ عند أول طلب"""
+    global _pool
+    with _lock:
+        if _pool is not pool:
+            return
+        _pool = None
+        _stuck.clear()
+        _stats["recycled"] += 1
+    procs = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        try:
+            p.kill()
+        except Exception:
+            pass
+
+
+def _count(key: str) -> None:
+    with _lock:
+        _stats[key] += 1
+
+
+def run(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """تنفيذ fn(*args) في عامل وانتظار نتيجتها حتى timeout (افتراضيًا COMPUTE_TIMEOUT)"""
+    pool = _get_pool()
+    if pool is None:
+        _count("inline")
+        return fn(*args, **kwargs)
+    timeout = COMPUTE_TIMEOUT if timeout is None else timeout
+    try:
+        fut = pool.submit(fn, *args, **kwargs)
+    except (BrokenProcessPool, RuntimeError):
+        _recycle(pool)
+        _count("inline")
+        return fn(*args, **kwargs)
+    _count("submitted")
+    try:
+        res = fut.result(timeout)
+    except _FutTimeout:
+        _count("timeouts")
+        if not fut.cancel():
+            with _lock:
+                _stuck[:] = [f for f in _stuck if not f.done()] + [fut]
+                full = len(_stuck) >= COMPUTE_WORKERS
+            if full:
+                _recycle(pool)
+        raise ComputeTimeout(f"{getattr(fn, '__name__', 'task')} > {timeout}s")
+    except BrokenProcessPool:
+        # عامل قُتل: المستدعون لا يعرفون هذا الخطأ (لم يكن موجودًا والتنفيذ مباشر)
+        _recycle(pool)
+        _count("broken")
+        _count("inline")
+        return fn(*args, **kwargs)
+    except Exception:
+        _count("failed")
+        raise
+    _count("completed")
+    return res
+
+
+async def arun(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """نفس run للشيفرة غير المتزامنة (الانتظار في خيط core/executor لا في الحلقة)"""
+    from core.executor import run_blocking
+    return await run_blocking(functools.partial(run, fn, *args, timeout=timeout, **kwargs))
+
+
+def warm() -> int:
+    """يشغّل العمال الآن (بدل أول طلب) — من تسخين main.py إن COMPUTE_WARM=1؛ يعيد عدد العمال الجاهزين"""
+    pool = _get_pool()
+    if pool is None:
+        return 0
+    t0 = time.time()
+    pids = {f.result(120) for f in [pool.submit(_ping) for _ in range(COMPUTE_WORKERS * 2)]}
+    print(f"[COMPUTE] {len(pids)} workers warm in {time.time()-t0:.2f}s")
+    return len(pids)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {"workers": COMPUTE_WORKERS, "running": _pool is not None,
+                "stuck": sum(1 for f in _stuck if not f.done()), **_stats}
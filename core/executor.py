@@ -0,0 +1,99 @@
+# core/executor.py — مجمّع خيوط محدود لاستدعاءات الحجب (requests / DDGS / SymPy ...)
+# الهدف: ألا يتجمّد الـ event loop الخاص بـ uvicorn بسبب استعلام بطيء واحد.
+from __future__ import annotations
+import os, asyncio, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+POOL_WORKERS = int(os.getenv("POOL_WORKERS", "8"))        # عدد الخيوط العاملة
+POOL_MAX_QUEUE = int(os.getenv("POOL_MAX_QUEUE", "64"))   # أقصى عدد مهام تنتظر دورها
+POOL_TIMEOUT = float(os.getenv("POOL_TIMEOUT", "45"))     # المهلة الافتراضية بالثواني
+
+
+class PoolBusy(RuntimeError):
+    """الطابور ممتلئ — الأفضل رفض الطلب (503) بدل تكديسه."""
+
+
+class BlockingPool:
+    def __init__(self, workers: int = POOL_WORKERS, max_queue: int = POOL_MAX_QUEUE, name: str = "blocking"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._in_flight = 0   # مُرسلة ولم تنتهِ بعد (تعمل + تنتظر)
+        self._active = 0      # تعمل الآن فعلاً
+        self._peak_queued = 0
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+        self._wait_ms_total = 0.0
+
+    def _wrap(self, fn: Callable, args, kwargs, t_submit: float):
+        with self._lock:
+            self._active += 1
+            self._wait_ms_total += (time.monotonic() - t_submit) * 1000
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """تنفيذ دالة حاجبة داخل المجمّع وانتظارها دون حجب الـ event loop."""
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._counts["rejected"] += 1
+                raise PoolBusy(f"queue_full:{self._in_flight - self._active}")
+            self._in_flight += 1
+            self._counts["submitted"] += 1
+            self._peak_queued = max(self._peak_queued, self._in_flight - self._active)
+
+        fut = self._ex.submit(self._wrap, fn, args, kwargs, time.monotonic())
+        try:
+            res = await asyncio.wait_for(asyncio.wrap_future(fut), timeout=timeout)
+        except asyncio.TimeoutError:
+            # المهمة تكمل في الخلفية (لا يمكن إيقاف خيط)، لكن المستدعي لا ينتظرها
+            with self._lock:
+                self._counts["timeouts"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._counts["failed"] += 1
+            raise
+        with self._lock:
+            self._counts["completed"] += 1
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._counts["submitted"] - (self._in_flight - self._active)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._in_flight - self._active,
+                "peak_queued": self._peak_queued,
+                "avg_wait_ms": round(self._wait_ms_total / started, 2) if started else 0.0,
+                **self._counts,
+            }
+
+
+pool = BlockingPool()
+
+
+async def run_blocking(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """اختصار: تشغيل دالة حاجبة في المجمّع المشترك."""
+    return await pool.run(fn, *args, timeout=timeout, **kwargs)
+
+
+_END = object()
+
+async def iterate_blocking(gen: Iterator, timeout: Optional[float] = None) -> AsyncIterator:
+    """
+    المرور على مولّد حاجب (مثل omni_stream) عنصرًا عنصرًا داخل المجمّع،
+    حتى يصل كل عنصر للعميل فور جاهزيته. timeout هنا لكل خطوة.
+    """
+    while True:
+        item = await pool.run(next, gen, _END, timeout=timeout)
+        if item is _END:
+            return
+        yield item
@@ -0,0 +1,230 @@
+# core/fetcher.py — جالب صفحات موحّد: عميل httpx غير متزامن واحد لكل العملية
+# بدل httpx.Client جديد لكل رابط (اتصال TCP/TLS جديد في كل مرة):
+#   - keep-alive (+ HTTP/2 إن كانت حزمة h2 مثبتة) → الجلب المتكرر من نفس المواقع
+#     (ويكيبيديا، الجزيرة، BBC ...) يعيد استخدام الاتصال المفتوح
+#   - حد للطلبات المتزامنة لكل مضيف (FETCH_PER_HOST) وحد كلي (FETCH_MAX_CONN)
+#   - الجسم يُقرأ كبثّ ويُقطع عند FETCH_MAX_BYTES (لا تنزيل لملفات ضخمة كاملة)
+#   - User-Agent وسياسة تحويل (redirect) موحّدة
+#   - sink اختياري يرى كل قطعة أثناء البث ويستطيع إيقاف التنزيل مبكرًا (core/html_extract)؛
+#     يُستدعى في خيط (asyncio.to_thread) حتى لا يوقف تحليله بقية الجلب الجاري على الحلقة
+#   - نوع المحتوى يُحدَّد من Content-Type وأول البايتات قبل قراءة الجسم (Page.kind):
+#     html | text | pdf (حد FETCH_PDF_MAX_BYTES، بلا sink) | binary (لا يُقرأ جسمه إطلاقًا)
+# الحلقة (event loop) تعمل في خيط خلفي واحد؛ الشيفرة المتزامنة تستدعي fetch_sync / get_text
+# والشيفرة غير المتزامنة (من أي حلقة) تستدعي afetch.
+from __future__ import annotations
+import os, re, asyncio, contextlib, threading
+import importlib.util
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "4"))
+FETCH_MAX_CONN = int(os.getenv("FETCH_MAX_CONN", "32"))
+FETCH_KEEPALIVE_SECS = float(os.getenv("FETCH_KEEPALIVE_SECS", "60"))
+FETCH_MAX_REDIRECTS = int(os.getenv("FETCH_MAX_REDIRECTS", "5"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+FETCH_PDF_MAX_BYTES = int(os.getenv("FETCH_PDF_MAX_BYTES", str(20 * 1024 * 1024)))
+HTTP2 = os.getenv("FETCH_HTTP2", "1").strip().lower() in {"1", "true", "yes", "on"} \
+    and importlib.util.find_spec("h2") is not None
+
+USER_AGENT = os.getenv(
+    "FETCH_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36 BassamBot",
+)
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([A-Za-z0-9_\-]+)""", re.I)
+
+_BINARY_PREFIXES = ("image/", "audio/", "video/", "font/")
+_BINARY_TYPES = {"application/zip", "application/gzip", "application/x-rar-compressed", "application/x-7z-compressed",
+                 "application/vnd.ms-excel", "application/msword", "application/x-msdownload",
+                 "application/x-shockwave-flash", "application/wasm"}
+_BINARY_MAGIC = (b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"PK\x03\x04", b"\x1f\x8b", b"RIFF", b"ID3", b"OggS",
+                 b"\x00\x00\x00", b"wOF", b"Rar!", b"7z\xbc\xaf", b"MZ")
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client = None
+_hosts: Dict[str, List] = {}  # مضيف → [Semaphore، عدد الطلبات الجارية والمنتظرة عليه]
+_stats = {"requests": 0, "errors": 0, "truncated": 0, "early_stop": 0, "bytes": 0, "http2": 0}
+_kinds = {"html": 0, "text": 0, "pdf": 0, "binary": 0}
+
+# sink(قطعة، charset من الترويسة أو None) → True = يكفي، أوقف التنزيل
+Sink = Callable[[bytes, Optional[str]], bool]
+
+
+class Page:
+    """نتيجة جلب واحد: الرابط النهائي بعد التحويلات، الحالة، الترويسات، نوع المحتوى، والجسم
+    (مقطوعًا عند الحد: truncated، أو أوقفه sink: stopped؛ فارغ إن كان kind == "binary")"""
+    __slots__ = ("url", "status", "headers", "content", "truncated", "stopped", "charset", "kind")
+
+    def __init__(self, url: str, status: int, headers, content: bytes, truncated: bool, charset: Optional[str],
+                 stopped: bool = False, kind: str = "html"):
+        self.url, self.status, self.headers = url, status, headers
+        self.content, self.truncated, self.charset = content, truncated, charset
+        self.stopped, self.kind = stopped, kind
+
+    @property
+    def text(self) -> str:
+        enc = self.charset
+        if not enc:
+            m = _META_CHARSET.search(self.content[:2048])
+            enc = m.group(1).decode("ascii") if m else "utf-8"
+        try:
+            return self.content.decode(enc, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+def _mime(content_type: str) -> str:
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def _binary_mime(ct: str) -> bool:
+    return ct.startswith(_BINARY_PREFIXES) or ct in _BINARY_TYPES
+
+
+def sniff(content_type: str, head: bytes) -> str:
+    """html | text | pdf | binary من Content-Type وأول البايتات (الترويسة قد تكذب: octet-stream لملف PDF ...)"""
+    ct = _mime(content_type)
+    if head.startswith(b"%PDF-") or ct == "application/pdf":
+        return "pdf"
+    if _binary_mime(ct) or head.startswith(_BINARY_MAGIC):
+        return "binary"
+    start = head[:1024].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if "html" in ct or start.startswith((b"<!doctype html", b"<html")) or b"<html" in start or b"<body" in start:
+        return "html"
+    if ct.startswith("text/") or ct.endswith(("json", "xml")) or not ct or ct == "application/octet-stream":
+        return "binary" if b"\x00" in head[:1024] else "text"
+    return "binary"
+
+
+# -------------------- الحلقة والعميل --------------------
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="fetch-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_client():
+    # يُستدعى داخل خيط الحلقة فقط
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            follow_redirects=True,
+            max_redirects=FETCH_MAX_REDIRECTS,
+            timeout=FETCH_TIMEOUT,
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "ar,en;q=0.8"},
+            limits=httpx.Limits(max_connections=FETCH_MAX_CONN, max_keepalive_connections=FETCH_MAX_CONN,
+                                keepalive_expiry=FETCH_KEEPALIVE_SECS),
+        )
+    return _client
+
+
+@contextlib.asynccontextmanager
+async def _host_slot(url: str):
+    """حد FETCH_PER_HOST لكل مضيف (داخل خيط الحلقة فقط)؛ يُحذف سيمافور المضيف حين لا يستخدمه طلب"""
+    host = (urlsplit(url).hostname or "").lower()
+    entry = _hosts.get(host)
+    if entry is None:
+        entry = _hosts[host] = [asyncio.Semaphore(FETCH_PER_HOST), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _hosts[host]
+
+
+async def _fetch(url: str, timeout: float, headers: Optional[Dict[str, str]], max_bytes: int,
+                 sink: Optional[Sink]) -> Page:
+    client = _get_client()
+    _stats["requests"] += 1
+    try:
+        async with _host_slot(url):
+            async with client.stream("GET", url, headers=headers, timeout=timeout) as r:
+                if r.status_code != 304:  # 304 = ردّ على طلب مشروط (core/page_cache)
+                    r.raise_for_status()
+                buf, size, truncated, stopped = [], 0, False, False
+                charset = r.charset_encoding
+                ctype = r.headers.get("content-type", "")
+                kind = "binary" if _binary_mime(_mime(ctype)) else None  # بلا قراءة أي بايت من الجسم
+                if kind is None and _mime(ctype) == "application/pdf" \
+                        and int(r.headers.get("content-length") or 0) > FETCH_PDF_MAX_BYTES:
+                    kind, truncated = "pdf", True  # PDF مقطوع لا يُقرأ: لا داعي لتنزيله
+                async for chunk in (r.aiter_bytes() if kind is None else _empty()):
+                    if kind is None:
+                        kind = sniff(ctype, chunk)
+                        if kind == "binary":
+                            break
+                        if kind == "pdf":
+                            max_bytes, sink = max(max_bytes, FETCH_PDF_MAX_BYTES), None
+                    buf.append(chunk)
+                    size += len(chunk)
+                    if sink is not None and await asyncio.to_thread(sink, chunk, charset):
+                        stopped = True
+                        break
+                    if size >= max_bytes:
+                        truncated = True
+                        break
+                kind = kind or sniff(ctype, b"")
+                content = b"".join(buf)[:max_bytes]
+                if r.status_code != 304:
+                    _kinds[kind] += 1
+                if r.http_version == "HTTP/2":
+                    _stats["http2"] += 1
+                _stats["bytes"] += len(content)
+                _stats["truncated"] += truncated
+                _stats["early_stop"] += stopped
+                return Page(str(r.url), r.status_code, r.headers, content, truncated, charset, stopped, kind)
+    except Exception:
+        _stats["errors"] += 1
+        raise
+
+
+async def _empty():
+    return
+    yield
+
+
+# -------------------- الواجهة --------------------
+def submit(url: str, timeout: float = FETCH_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+           max_bytes: Optional[int] = None, sink: Optional[Sink] = None):
+    """يرسل الجلب إلى الحلقة الخلفية ويعيد concurrent.futures.Future"""
+    coro = _fetch(url.strip(), timeout, headers, max_bytes or FETCH_MAX_BYTES, sink)
+    return asyncio.run_coroutine_threadsafe(coro, _ensure_loop())
+
+
+async def afetch(url: str, timeout: float = FETCH_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+                 max_bytes: Optional[int] = None, sink: Optional[Sink] = None) -> Page:
+    """للشيفرة غير المتزامنة (من أي حلقة): لا يحجب حلقة المستدعي"""
+    return await asyncio.wrap_future(submit(url, timeout, headers, max_bytes, sink))
+
+
+def fetch_sync(url: str, timeout: float = FETCH_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+               max_bytes: Optional[int] = None, sink: Optional[Sink] = None) -> Page:
+    """للشيفرة المتزامنة (خيوط core/executor): يرفع الاستثناء كما هو (HTTPStatusError، مهلة ...)"""
+    fut = submit(url, timeout, headers, max_bytes, sink)
+    try:
+        return fut.result(timeout + 1)
+    except Exception:
+        fut.cancel()
+        raise
+
+
+def get_text(url: str, timeout: float = FETCH_TIMEOUT, max_bytes: Optional[int] = None) -> str:
+    """نص الصفحة الخام (HTML) — بديل client.get(url).text"""
+    return fetch_sync(url, timeout, max_bytes=max_bytes).text
+
+
+def stats() -> Dict:
+    return {**_stats, "kinds": dict(_kinds), "hosts": len(_hosts), "http2_enabled": HTTP2, "per_host": FETCH_PER_HOST,
+            "max_bytes": FETCH_MAX_BYTES}
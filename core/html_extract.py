@@ -0,0 +1,178 @@
+# core/html_extract.py — استخراج متن الصفحة أثناء البث مع قطع مبكر
+# بدل تنزيل الصفحة كاملة ثم readability على كل HTML (والإجابة لا تأخذ إلا ~4000 حرف):
+#   - Collector يُغذّى بقطع الجسم أثناء التنزيل (sink لـ core/fetcher) ويحلّلها تدريجيًا
+#     (html.parser من المكتبة القياسية)، ويجمع فقرات <p> الطويلة قليلة الروابط
+#     خارج script/style/nav/header/footer/aside/form
+#   - يوقف التنزيل فور تجمّع EXTRACT_TARGET_CHARS من نص المتن، أو عند EXTRACT_MAX_BYTES
+#   - إن لم يكتمل الهدف: كثافة الفقرات (نص الفقرات / كل النص الظاهر) تقرر إن كانت الفقرات
+#     كافية؛ وإلا نرجع لـ readability على ما نُزِّل فقط
+# route(): التوجيه حسب Page.kind (core/fetcher): HTML فقط يمر بمسار HTML، و PDF لمستخرج PDF
+# (src/rag/pdf_ingest داخل core/compute)، والنص العادي كما هو، والثنائي يُتجاوز
+from __future__ import annotations
+import os, re, codecs, threading
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+EXTRACT_TARGET_CHARS = int(os.getenv("EXTRACT_TARGET_CHARS", "4000"))
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(512 * 1024)))
+EXTRACT_MIN_DENSITY = float(os.getenv("EXTRACT_MIN_DENSITY", "0.35"))
+MIN_PARA_CHARS = 60      # أقصر فقرة تُحسب من المتن
+MIN_FAST_CHARS = 400     # أقل نص متن يُقبل دون readability
+
+_SKIP = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "template", "iframe",
+         "select", "button"}
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([A-Za-z0-9_\-]+)""", re.I)
+
+_lock = threading.Lock()
+_stats = {"pages": 0, "fast": 0, "readability": 0, "early_stop": 0}
+_routes = {"html": 0, "text": 0, "pdf": 0, "pdf_failed": 0, "skipped": 0}
+
+
+class Collector(HTMLParser):
+    """sink للجالب: feed(قطعة، charset) → True حين يكفي ما جُمع (يُستدعى في خيط لا في حلقة الجالب)"""
+
+    def __init__(self, target: int = EXTRACT_TARGET_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+        self.paragraphs: List[str] = []
+        self.content_chars = 0
+        self.visible_chars = 0
+        self._decoder = None
+        self._skip = 0
+        self._in_p = False
+        self._in_a = 0
+        self._buf: List[str] = []
+        self._link_chars = 0
+
+    # ---------- التغذية ----------
+    def feed_bytes(self, chunk: bytes, charset: Optional[str] = None) -> bool:
+        if self.enough():
+            return True  # لا تحليل بعد بلوغ الهدف
+        if self._decoder is None:
+            enc = charset
+            if not enc:
+                m = _META_CHARSET.search(chunk[:2048])
+                enc = m.group(1).decode("ascii") if m else "utf-8"
+            try:
+                self._decoder = codecs.getincrementaldecoder(enc)(errors="replace")
+            except LookupError:
+                self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            self.feed(self._decoder.decode(chunk))
+        except Exception:
+            pass  # HTML معطوب: نكتفي بما جُمع
+        return self.enough()
+
+    __call__ = feed_bytes
+
+    def enough(self) -> bool:
+        return self.content_chars >= self.target
+
+    # ---------- HTMLParser ----------
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP:
+            self._skip += 1
+        elif tag == "p":
+            self._flush()
+            self._in_p = True
+        elif tag == "a" and self._in_p:
+            self._in_a += 1
+        elif tag == "br" and self._in_p:
+            self._buf.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "p":
+            self._flush()
+        elif tag == "a" and self._in_a:
+            self._in_a -= 1
+        elif tag in ("div", "section", "article", "td", "li", "body"):
+            self._flush()  # فقرة لم تُغلق صراحة
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        n = len(data.strip())
+        self.visible_chars += n
+        if self._in_p:
+            self._buf.append(data)
+            if self._in_a:
+                self._link_chars += n
+
+    def _flush(self) -> None:
+        if self._in_p and not self.enough():
+            text = " ".join("".join(self._buf).split())
+            if len(text) >= MIN_PARA_CHARS and self._link_chars < 0.5 * len(text):
+                self.paragraphs.append(text)
+                self.content_chars += len(text)
+        self._in_p, self._in_a, self._buf, self._link_chars = False, 0, [], 0
+
+    # ---------- النتيجة ----------
+    def density(self) -> float:
+        return self.content_chars / self.visible_chars if self.visible_chars else 0.0
+
+    def good_enough(self) -> bool:
+        """الفقرات وحدها تكفي (بلا readability)؟"""
+        self._flush()
+        if self.enough():
+            return True
+        return (len(self.paragraphs) >= 2 and self.content_chars >= MIN_FAST_CHARS
+                and self.density() >= EXTRACT_MIN_DENSITY)
+
+    def text(self) -> str:
+        """نص المتن بحد target حرفًا (القطعة الأخيرة قد تحمل فقرات أكثر من الحاجة)"""
+        return "\n".join(self.paragraphs)[:self.target]
+
+
+def _pdf_text(page) -> str:
+    from core import compute
+    from src.rag.pdf_ingest import text_from_bytes
+    if page.truncated or not page.content:
+        return ""  # PDF أكبر من FETCH_PDF_MAX_BYTES: الملف المقطوع لا يُفتح
+    return " ".join(compute.run(text_from_bytes, page.content).split())
+
+
+def route(page, html_fn) -> str:
+    """نص الصفحة حسب نوعها؛ html_fn(page) لـ HTML فقط"""
+    kind = getattr(page, "kind", "html")
+    if kind == "pdf":
+        try:
+            text = _pdf_text(page)
+        except Exception:
+            text = ""
+        _count_route("pdf" if text else "pdf_failed")
+        return text
+    if kind == "binary":
+        _count_route("skipped")
+        return ""
+    if kind == "text":
+        _count_route("text")
+        return page.text
+    _count_route("html")
+    return html_fn(page)
+
+
+def _count_route(key: str) -> None:
+    with _lock:
+        _routes[key] += 1
+
+
+def main_text(page, collector: Collector, fallback) -> str:
+    """(HTML فقط — عبر route) نص الفقرات إن كفى، وإلا fallback(page) (readability على ما نُزِّل)"""
+    fast = collector.good_enough()
+    with _lock:
+        _stats["pages"] += 1
+        _stats["fast" if fast else "readability"] += 1
+        _stats["early_stop"] += bool(getattr(page, "stopped", False))
+    return collector.text() if fast else fallback(page)
+
+
+def stats() -> Dict:
+    with _lock:
+        s = dict(_stats)
+        s["routes"] = dict(_routes)
+    s["fast_ratio"] = round(s["fast"] / s["pages"], 3) if s["pages"] else 0.0
+    s["target_chars"] = EXTRACT_TARGET_CHARS
+    s["max_bytes"] = EXTRACT_MAX_BYTES
+    return s
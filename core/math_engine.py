@@ -4,6 +4,8 @@ import sympy as sp
 from sympy import symbols, sympify, Eq, solveset, S, diff, integrate, factor, pi, sin, cos, tan, log, sqrt
 from sympy import Poly
 
+from core import compute
+
 X = symbols("x")
 SAFE = {"x": X, "pi": pi, "sin": sin, "cos": cos, "tan": tan, "log": log, "sqrt": sqrt}
 
@@ -61,6 +63,16 @@ def _list_roots(title, roots):
     return f"<h3>{title}</h3><div>{body}</div>"
 
 def solve_query(q: str) -> str:
+    # SymPy في عملية من core/compute بمهلة: تبسيط عالق لا يوقف الخادم
+    try:
+        return compute.run(_solve_query, q, timeout=compute.MATH_TIMEOUT)
+    except compute.ComputeTimeout:
+        return (
+            "<h2>تجاوزت المسألة المهلة</h2>"
+            f"<div>لم ينتهِ الحل خلال {compute.MATH_TIMEOUT:g} ثانية. جرّب صياغة أبسط أو درجة أقل.</div>"
+        )
+
+def _solve_query(q: str) -> str:
     q = (q or "").strip()
 
     # ===== حل معادلة =====
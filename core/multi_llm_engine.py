@@ -11,6 +11,8 @@ import time
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 
+from core.singleflight import group, norm_key
+
 @dataclass
 class LLMModel:
     """تعريف نموذج لغوي"""
@@ -174,8 +176,11 @@ class MultiLLMEngine:
         return True
     
     async def generate_response(self, prompt: str, context: str = "", max_tokens: int = 1000) -> Dict[str, Any]:
-        """توليد رد ذكي باستخدام أفضل نموذج متاح"""
-        
+        """توليد رد ذكي باستخدام أفضل نموذج متاح (نفس الطلب المتزامن يُرسَل للنموذج مرة واحدة)"""
+        key = norm_key(prompt, context, max_tokens)
+        return await group("llm").do_async(key, self._generate_response, prompt, context, max_tokens)
+    
+    async def _generate_response(self, prompt: str, context: str, max_tokens: int) -> Dict[str, Any]:
         if not self.active_models:
             return {
                 'success': False,
@@ -0,0 +1,81 @@
+# core/page_cache.py — كاش النص المستخرج من صفحات الويب مع إعادة تحقق HTTP مشروطة
+# المفتاح = (نوع المستخرِج، الرابط) → {النص النظيف، ETag، Last-Modified، وقت الجلب، حجم الصفحة}
+#   - عنصر حديث (أقل من PAGE_FRESH_SECS): يُعاد النص مباشرة، بلا شبكة ولا تحليل HTML
+#   - عنصر قديم: طلب مع If-None-Match / If-Modified-Since؛ الرد 304 يعني لا تنزيل ولا readability
+#   - رد 200: استخراج جديد وحفظ الترويسات الجديدة
+# التخزين عبر core/cache_layer (مساحة "pages": L1 في الذاكرة + L2 على القرص إن وُجد diskcache)
+from __future__ import annotations
+import os, time, threading
+from typing import Callable, Dict, Optional
+
+from core import fetcher
+from core.cache_layer import cache as _cache_layer
+
+PAGE_FRESH_SECS = int(os.getenv("PAGE_FRESH_SECS", str(60 * 60)))           # بلا إعادة تحقق
+PAGE_KEEP_SECS = int(os.getenv("PAGE_KEEP_SECS", str(7 * 24 * 60 * 60)))   # مدة بقاء العنصر للتحقق
+
+_cache = _cache_layer.namespace("pages", default_ttl=PAGE_KEEP_SECS)
+_lock = threading.Lock()
+_stats = {"lookups": 0, "fresh_hits": 0, "revalidated": 0, "refetched": 0, "misses": 0,
+          "stale_served": 0, "bytes_saved": 0, "bytes_fetched": 0}
+
+
+def _count(**kw) -> None:
+    with _lock:
+        for k, v in kw.items():
+            _stats[k] += v
+
+
+def cached_text(url: str, extract: Callable[[fetcher.Page], str], kind: str = "text",
+                timeout: float = fetcher.FETCH_TIMEOUT, max_bytes: Optional[int] = None,
+                sink: Optional[fetcher.Sink] = None) -> str:
+    """
+    النص المستخرج للرابط: extract(page) لا تُستدعى إلا عند تنزيل جسم جديد (200).
+    kind يفصل بين مستخرِجات مختلفة لنفس الرابط. يرفع استثناء الجلب إن لم يوجد نص محفوظ.
+    max_bytes / sink يُمرَّران للجالب (قطع مبكر أثناء البث).
+    """
+    url = url.strip()
+    key = f"{kind}:{url}"
+    entry = _cache.get(key)
+    now = time.time()
+    _count(lookups=1)
+    if entry and now - entry["fetched_at"] < PAGE_FRESH_SECS:
+        _count(fresh_hits=1, bytes_saved=entry["bytes"])
+        return entry["text"]
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        page = fetcher.fetch_sync(url, timeout, headers=headers or None, max_bytes=max_bytes, sink=sink)
+    except Exception:
+        if entry:  # الموقع لا يستجيب: النص القديم أفضل من لا شيء
+            _count(stale_served=1)
+            return entry["text"]
+        raise
+
+    if page.status == 304 and entry:
+        entry = {**entry, "fetched_at": now}
+        _cache.set(key, entry)
+        _count(revalidated=1, bytes_saved=entry["bytes"])
+        return entry["text"]
+
+    _count(**({"refetched": 1} if entry else {"misses": 1}), bytes_fetched=len(page.content))
+    text = extract(page)
+    if text:
+        _cache.set(key, {"text": text, "etag": page.headers.get("etag"),
+                         "last_modified": page.headers.get("last-modified"),
+                         "fetched_at": now, "bytes": len(page.content)})
+    return text
+
+
+def stats() -> Dict:
+    with _lock:
+        s = dict(_stats)
+    served = s["fresh_hits"] + s["revalidated"]
+    s["hit_rate"] = round(served / s["lookups"], 3) if s["lookups"] else 0.0
+    s["fresh_secs"] = PAGE_FRESH_SECS
+    return s
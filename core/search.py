@@ -1,11 +1,21 @@
 # core/search.py — نسخة مطورة (بحث عميق + فتح الروابط الأصلية مباشرة)
 from typing import List, Dict, Optional
-import requests, re
-from duckduckgo_search import DDGS
-from bs4 import BeautifulSoup
+import os, time, asyncio
 import urllib.parse
+# requests / httpx / bs4 / DDGS تُستورد داخل الدوال — إقلاع أسرع
+
+from core.executor import BlockingPool, PoolBusy, POOL_WORKERS
+from core.singleflight import group, norm_key
 
 # تهيئة بسيطة
+SEARCH_BUDGET = float(os.getenv("SEARCH_BUDGET", "8"))  # ميزانية البحث المتوازي بالثواني
+DDG_TIMEOUT = float(os.getenv("SEARCH_DDG_TIMEOUT", "6"))  # مهلة طلب DDGS الواحد
+# الاستعلامات الفرعية (~10 لكل طلب) في مجمّع خاص أصغر من المجمّع المشترك: خيوط DDGS
+# البطيئة (لا تُلغى بعد انتهاء المهلة) لا تحجز خيوط omni_answer
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(max(1, POOL_WORKERS // 2))))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "16"))
+search_pool = BlockingPool(SEARCH_WORKERS, SEARCH_MAX_QUEUE, name="search")
+
 UA = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                   "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
@@ -33,7 +43,8 @@ def _ddg_api(q: str, max_results: int = 12) -> List[Dict]:
     """بحث عبر واجهة DuckDuckGo المجانية"""
     out = []
     try:
-        with DDGS() as ddg:
+        from duckduckgo_search import DDGS
+        with DDGS(timeout=DDG_TIMEOUT) as ddg:
             for r in ddg.text(q, region="xa-ar", safesearch="moderate", max_results=max_results):
                 t = (r.get("title") or "").strip()
                 u = (r.get("href") or r.get("url") or "").strip()
@@ -47,11 +58,20 @@ def _ddg_api(q: str, max_results: int = 12) -> List[Dict]:
 
 def _ddg_html_fallback(q: str, max_results: int = 12) -> List[Dict]:
     """خطة بديلة تكشط نتائج DuckDuckGo مباشرة"""
-    out = []
     try:
+        import requests
         url = "https://duckduckgo.com/html/?q=" + requests.utils.quote(q)
         r = requests.get(url, headers=UA, timeout=10)
-        soup = BeautifulSoup(r.text, "html.parser")
+        return _parse_ddg_html(r.text, max_results)
+    except Exception:
+        return []
+
+def _parse_ddg_html(html_text: str, max_results: int) -> List[Dict]:
+    """استخراج النتائج من صفحة DuckDuckGo HTML"""
+    out = []
+    try:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_text, "html.parser")
 
         for a in soup.select("a.result__a")[:max_results]:
             title = a.get_text(" ", strip=True)
@@ -72,22 +92,28 @@ def _ddg_html_fallback(q: str, max_results: int = 12) -> List[Dict]:
 def _wiki_summary(q: str) -> Optional[Dict]:
     """جلب ملخص من ويكيبيديا العربية أو الإنجليزية"""
     try:
+        import requests
         for lang in ("ar", "en"):
             url = f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/" + requests.utils.quote(q.replace(" ", "_"))
             r = requests.get(url, headers=UA, timeout=8)
             if r.status_code == 200:
-                data = r.json()
-                title = data.get("title") or q
-                extract = data.get("extract") or ""
-                page = data.get("content_urls", {}).get("desktop", {}).get("page") or data.get("source") or ""
-                if page:
-                    return _norm_item(title, page, extract)
+                item = _wiki_item(r.json(), q)
+                if item:
+                    return item
     except Exception:
         pass
     return None
 
-def deep_search(q: str, include_prices: bool = False) -> List[Dict]:
-    """بحث عام + موسع"""
+def _wiki_item(data: Dict, q: str) -> Optional[Dict]:
+    title = data.get("title") or q
+    extract = data.get("extract") or ""
+    page = data.get("content_urls", {}).get("desktop", {}).get("page") or data.get("source") or ""
+    if page:
+        return _norm_item(title, page, extract)
+    return None
+
+def _deep_queries(q: str, include_prices: bool = False) -> List[str]:
+    """الاستعلامات الفرعية للبحث الموسع (الترتيب مهم لإزالة التكرار)"""
     queries = [
         q,
         f"{q} site:wikipedia.org",
@@ -100,43 +126,151 @@ def deep_search(q: str, include_prices: bool = False) -> List[Dict]:
 
     if include_prices:
         queries += [f"{q} site:amazon.ae", f"{q} site:noon.com", f"{q} site:aliexpress.com"]
+    return queries
+
+def _sub_search(sub: str, max_results: int = 8) -> List[Dict]:
+    """استعلام فرعي واحد: الواجهة أولاً ثم الكشط كخطة بديلة"""
+    res = _ddg_api(sub, max_results=max_results)
+    if not res:
+        res = _ddg_html_fallback(sub, max_results=max_results)
+    return res
 
-    results, seen = [], set()
+class _Merger:
+    """يدمج دفعات النتائج بنفس ترتيب push() مع حذف الروابط المكررة"""
+    def __init__(self):
+        self.results: List[Dict] = []
+        self.seen = set()
 
-    def push(items: List[Dict]):
+    def push(self, items: List[Dict]):
         for it in items:
             u = it.get("url")
-            if not u or u in seen:
+            if not u or u in self.seen:
                 continue
-            seen.add(u)
+            self.seen.add(u)
             if not it.get("snippet"):
                 it["snippet"] = it.get("title") or ""
-            results.append(it)
+            self.results.append(it)
+
+async def _ddg_html_fallback_async(q: str, max_results: int = 12) -> List[Dict]:
+    """نفس _ddg_html_fallback لكن بطلب httpx غير حاجب"""
+    try:
+        import httpx
+        url = "https://duckduckgo.com/html/?q=" + urllib.parse.quote(q)
+        async with httpx.AsyncClient(headers=UA, timeout=10, follow_redirects=True) as client:
+            r = await client.get(url)
+        html_text = r.text
+    except Exception:
+        return []
+    # التحليل نفسه خفيف؛ نعيد استخدام منطق الكشط على النص الجاهز
+    return _parse_ddg_html(html_text, max_results)
+
+async def _wiki_summary_async(q: str) -> Optional[Dict]:
+    """نفس _wiki_summary لكن غير حاجب"""
+    try:
+        import httpx
+        async with httpx.AsyncClient(headers=UA, timeout=8, follow_redirects=True) as client:
+            for lang in ("ar", "en"):
+                url = f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/" + urllib.parse.quote(q.replace(" ", "_"))
+                r = await client.get(url)
+                if r.status_code == 200:
+                    item = _wiki_item(r.json(), q)
+                    if item:
+                        return item
+    except Exception:
+        pass
+    return None
+
+def deep_search(q: str, include_prices: bool = False) -> List[Dict]:
+    """بحث عام + موسع (الطلبات المتطابقة المتزامنة تُنفَّذ مرة واحدة)"""
+    return group("search").do(norm_key(q, include_prices), _deep_search, q, include_prices)
 
-    for sub in queries:
-        res = _ddg_api(sub, max_results=8)
-        if not res:
-            res = _ddg_html_fallback(sub, max_results=8)
-        push(res)
+def _deep_search(q: str, include_prices: bool = False) -> List[Dict]:
+    m = _Merger()
+    for sub in _deep_queries(q, include_prices):
+        m.push(_sub_search(sub))
 
     # في حال النتائج قليلة جدًا
-    if len(results) < 5:
+    if len(m.results) < 5:
         w = _wiki_summary(q)
         if w:
-            push([w])
+            m.push([w])
 
-    return results[:30]
+    return m.results[:30]
 
-def people_search(name: str) -> List[Dict]:
-    """بحث عن أشخاص أو حسابات"""
-    engines = [
-        "facebook.com", "twitter.com", "instagram.com", "youtube.com",
-        "linkedin.com", "t.me", "threads.net", "github.com", "snapchat.com", "tikTok.com"
-    ]
+async def _sub_search_async(sub: str, max_results: int = 8) -> List[Dict]:
+    """DDGS حاجبة فتعمل في search_pool (قد ترفع PoolBusy)؛ أما الكشط البديل فغير حاجب أصلاً"""
+    res = await search_pool.run(_ddg_api, sub, max_results=max_results)
+    if not res:
+        res = await _ddg_html_fallback_async(sub, max_results=max_results)
+    return res
+
+async def _fan_out(queries: List[str], max_results: int, budget: float):
+    """
+    تشغيل الاستعلامات الفرعية معًا؛ تُرجع (الدفعات بترتيب الاستعلامات، ما انتهت مهلته،
+    ما رُفض لامتلاء search_pool)
+    """
+    tasks = [asyncio.ensure_future(_sub_search_async(sub, max_results)) for sub in queries]
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for t in pending:
+        t.cancel()  # ما يعمل داخل المجمّع يكمل في الخلفية لكن لا ننتظره
+
+    batches: List[List[Dict]] = []
+    timed_out: List[str] = []
+    rejected: List[str] = []
+    for sub, t in zip(queries, tasks):
+        if t in pending:
+            timed_out.append(sub)
+            batches.append([])
+        elif t.exception():
+            if isinstance(t.exception(), PoolBusy):
+                rejected.append(sub)
+            batches.append([])
+        else:
+            batches.append(t.result())
+    return batches, timed_out, rejected
+
+async def deep_search_async(q: str, include_prices: bool = False, budget: Optional[float] = None) -> Dict:
+    """
+    نسخة متوازية من deep_search بمهلة إجمالية واحدة.
+    تُرجع ما وصل قبل انتهاء المهلة، بنفس ترتيب الاستعلامات (وليس ترتيب الوصول)،
+    مع قائمة الاستعلامات الفرعية التي لم تكتمل.
+    """
+    return await group("search").do_async(norm_key("async", q, include_prices), _deep_search_async, q, include_prices, budget)
+
+async def _deep_search_async(q: str, include_prices: bool, budget: Optional[float]) -> Dict:
+    budget = SEARCH_BUDGET if budget is None else budget
+    t0 = time.monotonic()
+    batches, timed_out, rejected = await _fan_out(_deep_queries(q, include_prices), 8, budget)
+
+    m = _Merger()
+    for b in batches:
+        m.push(b)
+
+    # في حال النتائج قليلة جدًا — ضمن ما تبقى من المهلة فقط
+    left = budget - (time.monotonic() - t0)
+    if len(m.results) < 5 and left > 0:
+        try:
+            w = await asyncio.wait_for(_wiki_summary_async(q), timeout=left)
+            if w:
+                m.push([w])
+        except asyncio.TimeoutError:
+            timed_out.append(f"wikipedia:{q}")
+
+    return {
+        "results": m.results[:30],
+        "timed_out": timed_out,
+        "rejected": rejected,
+        "latency_ms": int((time.monotonic() - t0) * 1000),
+    }
+
+PEOPLE_ENGINES = [
+    "facebook.com", "twitter.com", "instagram.com", "youtube.com",
+    "linkedin.com", "t.me", "threads.net", "github.com", "snapchat.com", "tikTok.com"
+]
+
+def _people_merge(batches: List[List[Dict]]) -> List[Dict]:
     out, seen = [], set()
-    for site in engines:
-        q = f'{name} site:{site}'
-        a = _ddg_api(q, max_results=6) or _ddg_html_fallback(q, max_results=6)
+    for a in batches:
         for it in a:
             u = _clean_duckduckgo_url(it.get("url") or "")
             if u and u not in seen:
@@ -144,3 +278,18 @@ def people_search(name: str) -> List[Dict]:
                 it["url"] = u
                 out.append(it)
     return out[:30]
+
+def people_search(name: str) -> List[Dict]:
+    """بحث عن أشخاص أو حسابات"""
+    batches = []
+    for site in PEOPLE_ENGINES:
+        q = f'{name} site:{site}'
+        batches.append(_ddg_api(q, max_results=6) or _ddg_html_fallback(q, max_results=6))
+    return _people_merge(batches)
+
+async def people_search_async(name: str, budget: Optional[float] = None) -> Dict:
+    """نسخة متوازية من people_search بنفس مهلة البحث العميق"""
+    budget = SEARCH_BUDGET if budget is None else budget
+    queries = [f'{name} site:{site}' for site in PEOPLE_ENGINES]
+    batches, timed_out, rejected = await _fan_out(queries, 6, budget)
+    return {"results": _people_merge(batches), "timed_out": timed_out, "rejected": rejected}
@@ -0,0 +1,134 @@
+# core/singleflight.py — دمج الطلبات المتطابقة المتزامنة (single-flight)
+# عندما يسأل عدة مستخدمين نفس السؤال في نفس اللحظة: ينفَّذ العمل مرة واحدة
+# ويُوزَّع الناتج (أو الخطأ) على كل المنتظرين. لا يخزّن شيئًا بعد الانتهاء — هذا ليس كاش.
+from __future__ import annotations
+import re, asyncio, hashlib, threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def norm_key(*parts: Any) -> str:
+    """مفتاح موحّد: أحرف صغيرة + مسافات مضغوطة، ثم بصمة قصيرة للنصوص الطويلة."""
+    raw = "\x1f".join(re.sub(r"\s+", " ", str(p or "")).strip().lower() for p in parts)
+    return raw if len(raw) <= 200 else hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._afuts: Dict[Hashable, asyncio.Future] = {}
+        self._async_waiting = 0
+        # calls: كل الطلبات، executions: ما نُفِّذ فعلاً، hits: ما أخذ ناتج طلب آخر
+        self._counts = {"calls": 0, "executions": 0, "hits": 0, "errors": 0}
+
+    # ---------- نسخة الخيوط (للدوال الحاجبة داخل المجمّع) ----------
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._counts["hits"] += 1
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._counts["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            with self._lock:
+                call.waiters -= 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    # ---------- نسخة async (لنفس الـ event loop) ----------
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        # العمل المشترك مهمة مستقلة؛ كل المستدعين (والأول منهم) ينتظرونها عبر shield:
+        # إلغاء أي مستدعٍ — ولو كان من أطلق العمل — لا يلغيه على الباقين
+        with self._lock:
+            self._counts["calls"] += 1
+            task = self._afuts.get(key)
+            if task is not None:
+                self._counts["hits"] += 1
+                self._async_waiting += 1
+        if task is not None:
+            try:
+                return await asyncio.shield(task)
+            finally:
+                with self._lock:
+                    self._async_waiting -= 1
+
+        task = asyncio.ensure_future(self._run_async(key, fn, *args, **kwargs))
+        # إن أُلغي كل المنتظرين قبل الخطأ: لا تحذير "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        with self._lock:
+            self._afuts[key] = task
+            self._counts["executions"] += 1
+        return await asyncio.shield(task)
+
+    async def _run_async(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        try:
+            return await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._afuts.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = sum(c.waiters for c in self._calls.values()) + self._async_waiting
+            calls = self._counts["calls"]
+            return {
+                **self._counts,
+                "in_flight": len(self._calls) + len(self._afuts),
+                "waiting": waiting,
+                "hit_rate": round(self._counts["hits"] / calls, 3) if calls else 0.0,
+            }
+
+
+_GROUPS: Dict[str, SingleFlight] = {}
+_GROUPS_LOCK = threading.Lock()
+
+def group(name: str) -> SingleFlight:
+    """مجموعة single-flight مشتركة بالاسم (search / page / llm ...)"""
+    with _GROUPS_LOCK:
+        g = _GROUPS.get(name)
+        if g is None:
+            g = _GROUPS[name] = SingleFlight(name)
+        return g
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    with _GROUPS_LOCK:
+        groups = list(_GROUPS.values())
+    return {g.name: g.stats() for g in groups}
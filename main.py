@@ -1,24 +1,26 @@
 # main.py — Bassam App (بحث + واجهة + Omni Brain مع حماية)
-import os, time, traceback, re, sys
+import os, time, traceback, re, sys, asyncio, json, threading, importlib
 from typing import Optional, List, Dict
 
 # اجعل بايثون يرى مجلد src/
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
 from fastapi import FastAPI, Request, Form, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 # بحثك الحالي من core/
-from core.search import deep_search, people_search
+from core.search import deep_search_async, people_search_async, search_pool
 from core.utils import ensure_dirs
+from core.executor import run_blocking, iterate_blocking, pool, PoolBusy, POOL_TIMEOUT
+from core import singleflight, cache_layer
 
 # العقل من src/brain/ (محمي)
 try:
-    from src.brain.omni_brain import omni_answer
+    from src.brain.omni_brain import omni_answer, omni_stream
 except Exception as _e:
-    omni_answer = None
+    omni_answer = omni_stream = None
     print("[WARN] omni_brain import failed:", _e)
 
 # مسارات
@@ -33,6 +35,47 @@ app = FastAPI(title="Bassam — Deep Search + Omni", version="3.3")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
+# ------------------------- تسخين المكتبات الثقيلة -------------------------
+# الاستيراد كسول في omni_brain و src/brain و core/search؛ هنا نسخّنها في خيط خلفي
+# بعد فتح المنفذ حتى لا يدفع أول مستخدم بعد الاستيقاظ كلفتها. WARMUP=0 للتعطيل.
+WARMUP_MODULES = (
+    "httpx", "bs4", "readability", "duckduckgo_search", "numpy",
+    "sumy.parsers.plaintext", "sumy.nlp.tokenizers", "sumy.summarizers.lex_rank", "sympy",
+)
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY", "3"))
+
+def _warm_up():
+    t0 = time.time()
+    for name in WARMUP_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"[WARMUP] {name}: {e}")
+    print(f"[WARMUP] done in {time.time()-t0:.2f}s")
+    if os.getenv("COMPUTE_WARM", "0").strip().lower() in {"1","true","yes","on"}:
+        try:
+            from core import compute  # عمليات الحساب الثقيل تبدأ الآن لا مع أول سؤال
+            compute.warm()
+        except Exception as e:
+            print(f"[WARMUP] compute: {e}")
+
+@app.on_event("startup")
+async def _schedule_warm_up():
+    if os.getenv("WARMUP", "1").strip().lower() in {"1","true","yes","on"}:
+        t = threading.Timer(WARMUP_DELAY, _warm_up)
+        t.daemon = True
+        t.start()
+
+# مراقبة docs/ و data/ و uploads/: الملفات الجديدة قابلة للبحث خلال ثوانٍ. RAG_WATCH=0 للتعطيل.
+@app.on_event("startup")
+async def _start_rag_watcher():
+    if os.getenv("RAG_WATCH", "1").strip().lower() in {"1","true","yes","on"}:
+        try:
+            from src.rag import watcher
+            print("[RAG] watcher:", watcher.start())
+        except Exception as e:
+            print("[WARN] rag watcher disabled:", e)
+
 # ------------------------- أدوات صغيرة -------------------------
 def _parse_bool(v) -> bool:
     if isinstance(v, bool): return v
@@ -54,6 +97,20 @@ def _simple_summarize(text: str, max_sentences: int = 5) -> str:
 def _sources_to_text(sources: List[Dict], limit: int = 12) -> str:
     return " ".join([(s.get("snippet") or "") for s in (sources or [])][:limit])
 
+async def _deep_search_response(q: str, include_prices: bool, t0: float, fallback_answer: str) -> Dict:
+    """بحث متوازي بمهلة ثم تلخيص النتائج بصيغة استجابة /search"""
+    ds = await deep_search_async(q, include_prices=include_prices)
+    hits = ds["results"]
+    text_blob = _sources_to_text(hits, limit=12)
+    answer = _simple_summarize(text_blob, 5) or fallback_answer
+    return {
+        "ok": True, "latency_ms": int((time.time()-t0)*1000),
+        "answer": answer,
+        "sources": [{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:12]],
+        "timed_out": ds["timed_out"],
+        "rejected": ds["rejected"],
+    }
+
 # ------------------------- تعريف بسام -------------------------
 _BASSAM_BIO = (
     "بسام الشتيمي حفظه الله هو مصمم تطبيق بسام الذكي، "
@@ -88,6 +145,23 @@ def healthz():
     # معلومة بسيطة مفيدة بالوضع الحالي
     return {"status":"ok", "omni_loaded": bool(omni_answer)}
 
+@app.get("/metrics")
+def metrics():
+    # عمق طابور مجمّع الاستدعاءات الحاجبة + عدادات دمج الطلبات المتطابقة
+    out = {"pool": pool.stats(), "search_pool": search_pool.stats(), "singleflight": singleflight.stats(),
+           "cache": cache_layer.stats()}
+    if "src.rag.service" in sys.modules:  # لا نستورد طبقة RAG من أجل المقاييس فقط
+        out["rag"] = sys.modules["src.rag.service"].stats()
+    if "core.fetcher" in sys.modules:
+        out["fetch"] = sys.modules["core.fetcher"].stats()
+    if "core.page_cache" in sys.modules:
+        out["pages"] = sys.modules["core.page_cache"].stats()
+    if "core.html_extract" in sys.modules:
+        out["extract"] = sys.modules["core.html_extract"].stats()
+    if "core.compute" in sys.modules:
+        out["compute"] = sys.modules["core.compute"].stats()
+    return out
+
 @app.get("/about_bassam")
 def about_bassam():
     return {"ok": True, "answer": _BASSAM_BIO}
@@ -115,41 +189,20 @@ async def search_api(request: Request, q: Optional[str] = Form(None), want_price
 
         # لو فعّلت روابط الأسعار → استخدم البحث التقليدي
         if _parse_bool(want_prices):
-            hits = deep_search(q, include_prices=True)
-            text_blob = _sources_to_text(hits, limit=12)
-            answer = _simple_summarize(text_blob, 5) or "تم العثور على نتائج — راجع الروابط."
-            return {
-                "ok": True, "latency_ms": int((time.time()-t0)*1000),
-                "answer": answer,
-                "sources": [{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:12]]
-            }
+            return await _deep_search_response(q, True, t0, "تم العثور على نتائج — راجع الروابط.")
 
         # الافتراضي: استخدم العقل Omni لكن داخل try/except حتى لا ينهار الخادم
         if omni_answer is not None:
             try:
-                ans = omni_answer(q)
+                ans = await run_blocking(omni_answer, q, timeout=POOL_TIMEOUT)
                 return {"ok": True, "latency_ms": int((time.time()-t0)*1000), "answer": ans, "sources": []}
             except Exception as e:
                 traceback.print_exc()
                 # سقوط آمن إلى البحث التقليدي بدل 502
-                hits = deep_search(q, include_prices=False)
-                text_blob = _sources_to_text(hits, limit=12)
-                answer = _simple_summarize(text_blob, 5) or f"omni_failed:{type(e).__name__} — تم العثور على روابط."
-                return {
-                    "ok": True, "latency_ms": int((time.time()-t0)*1000),
-                    "answer": answer,
-                    "sources": [{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:12]]
-                }
+                return await _deep_search_response(q, False, t0, f"omni_failed:{type(e).__name__} — تم العثور على روابط.")
 
         # لو omni غير متاح: بحث تقليدي
-        hits = deep_search(q, include_prices=False)
-        text_blob = _sources_to_text(hits, limit=12)
-        answer = _simple_summarize(text_blob, 5) or "تم العثور على نتائج — راجع الروابط."
-        return {
-            "ok": True, "latency_ms": int((time.time()-t0)*1000),
-            "answer": answer,
-            "sources": [{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:12]]
-        }
+        return await _deep_search_response(q, False, t0, "تم العثور على نتائج — راجع الروابط.")
 
     except Exception as e:
         traceback.print_exc()
@@ -173,8 +226,10 @@ async def people_api(request: Request, name: Optional[str] = Form(None)):
         if bassam_answer:
             return {"ok": True, "sources": [], "answer": bassam_answer}
 
-        hits = people_search(name) or []
-        return {"ok":True, "sources":[{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:20]]}
+        ps = await people_search_async(name)
+        hits = ps["results"] or []
+        return {"ok":True, "sources":[{"title":h.get("title") or h.get("url"), "url":h.get("url")} for h in hits[:20]],
+                "timed_out": ps["timed_out"], "rejected": ps["rejected"]}
     except Exception as e:
         traceback.print_exc()
         return JSONResponse({"ok":False,"error":f"people_failed:{type(e).__name__}"}, 500)
@@ -196,7 +251,11 @@ async def api_omni(request: Request, message: Optional[str] = Form(None)):
             return JSONResponse({"ok": False, "error": "message_is_empty"}, status_code=400)
 
         try:
-            ans = omni_answer(message)
+            ans = await run_blocking(omni_answer, message, timeout=POOL_TIMEOUT)
+        except PoolBusy:
+            return JSONResponse({"ok": False, "error": "server_busy"}, status_code=503)
+        except asyncio.TimeoutError:
+            return JSONResponse({"ok": False, "error": "omni_timeout"}, status_code=504)
         except Exception as e:
             traceback.print_exc()
             return JSONResponse({"ok": False, "error": f"omni_failed:{type(e).__name__}"}, status_code=500)
@@ -206,6 +265,86 @@ async def api_omni(request: Request, message: Optional[str] = Form(None)):
         traceback.print_exc()
         return JSONResponse({"ok": False, "error": f"omni_route_failed:{type(e).__name__}"}, status_code=500)
 
+# ------------------------- البث المرحلي (SSE) -------------------------
+# الأحداث: intent → sources → partial → final (أو error). أول بايت يصل فور تحديد النية.
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _read_param(request: Request, key: str) -> str:
+    """يقرأ الحقل من الرابط (EventSource) أو النموذج أو JSON"""
+    v = request.query_params.get(key)
+    if not v and request.method == "POST":
+        try:
+            form = await request.form()
+            v = form.get(key)
+        except Exception:
+            v = None
+        if not v:
+            try:
+                v = (await request.json()).get(key)
+            except Exception:
+                v = None
+    return (v or "").strip() if isinstance(v, str) else ""
+
+async def _omni_events(message: str, t0: float):
+    try:
+        async for ev, data in iterate_blocking(omni_stream(message), timeout=POOL_TIMEOUT):
+            if ev == "final":
+                data = {**data, "latency_ms": int((time.time()-t0)*1000)}
+            yield _sse(ev, data)
+    except PoolBusy:
+        yield _sse("error", {"error": "server_busy"})
+    except asyncio.TimeoutError:
+        yield _sse("error", {"error": "omni_timeout"})
+    except Exception as e:
+        traceback.print_exc()
+        yield _sse("error", {"error": f"omni_failed:{type(e).__name__}"})
+
+async def _deep_search_events(q: str, include_prices: bool, t0: float):
+    yield _sse("intent", {"intent": "deep_search", "prices": include_prices})
+    resp = await _deep_search_response(q, include_prices, t0, "تم العثور على نتائج — راجع الروابط.")
+    yield _sse("sources", {"stage": "web", "sources": resp["sources"], "timed_out": resp["timed_out"],
+                              "rejected": resp["rejected"]})
+    yield _sse("final", {"answer": resp["answer"], "latency_ms": resp["latency_ms"]})
+
+async def _search_events(q: str, want_prices: bool, t0: float):
+    bassam_answer = _maybe_bassam_answer(q)
+    if bassam_answer:
+        yield _sse("final", {"answer": bassam_answer, "latency_ms": int((time.time()-t0)*1000)})
+        return
+    if want_prices or omni_stream is None:
+        async for chunk in _deep_search_events(q, want_prices, t0):
+            yield chunk
+        return
+    failed = False
+    async for chunk in _omni_events(q, t0):
+        if chunk.startswith("event: error"):
+            failed = True  # سقوط آمن إلى البحث التقليدي كما في /search
+            break
+        yield chunk
+    if failed:
+        async for chunk in _deep_search_events(q, False, t0):
+            yield chunk
+
+@app.api_route("/api/omni/stream", methods=["GET", "POST"])
+async def api_omni_stream(request: Request):
+    if omni_stream is None:
+        return JSONResponse({"ok": False, "error": "omni_brain_not_available"}, status_code=500)
+    message = await _read_param(request, "message")
+    if not message:
+        return JSONResponse({"ok": False, "error": "message_is_empty"}, status_code=400)
+    return StreamingResponse(_omni_events(message, time.time()), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+@app.api_route("/search/stream", methods=["GET", "POST"])
+async def search_stream(request: Request):
+    q = await _read_param(request, "q")
+    if not q:
+        return JSONResponse({"ok":False,"error":"query_is_empty"}, 400)
+    want_prices = _parse_bool(await _read_param(request, "want_prices"))
+    return StreamingResponse(_search_events(q, want_prices, time.time()), media_type="text/event-stream", headers=_SSE_HEADERS)
+
 @app.get("/omni", response_class=HTMLResponse)
 def omni_form(request: Request):
     html = """
@@ -231,13 +370,28 @@ pre{white-space:pre-wrap;background:#0f1830;border:1px solid var(--line);padding
     return HTMLResponse(html)
 
 # ------------------------- رفع الملفات -------------------------
+def _ingest_pdf(path: str):
+    try:
+        from src.rag.pdf_ingest import ingest
+        ingest(path)
+    except Exception as e:
+        print("[WARN] pdf ingest failed:", path, e)
+
 @app.post("/upload_pdf")
 async def upload_pdf(file: UploadFile = File(...)):
     try:
         fname = os.path.basename(file.filename)
         dest = os.path.join(UPLOADS_DIR, fname)
+        # على دفعات: الكتب الكبيرة لا تُحمَّل كاملة في الذاكرة
         with open(dest,"wb") as f:
-            f.write(await file.read())
+            while True:
+                chunk = await file.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+        # استخراج الصفحات في الخلفية (متوازٍ ويُستأنف إن انقطع) حتى يجده الفهرس جاهزًا
+        if fname.lower().endswith(".pdf"):
+            threading.Thread(target=_ingest_pdf, args=(dest,), daemon=True).start()
         return {"ok":True,"message":"تم الرفع.","filename":fname}
     except Exception as e:
         traceback.print_exc()
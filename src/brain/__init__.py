@@ -15,45 +15,34 @@ from __future__ import annotations
 import re
 import math
 from datetime import datetime
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Iterator
 
-# ========= رياضيات =========
-from sympy import symbols, Eq, sympify, solve, diff, integrate, sin, cos, tan, exp, log  # noqa: F401
+# ========= المكتبات الثقيلة =========
+# sympy / DDGS / httpx / bs4 / readability / sumy / googletrans / wikipedia
+# تُستورد عند أول استخدام داخل الدوال (هذا الملف يُنفَّذ مع أي import من src.brain،
+# ومنه omni_brain في main.py، فلا نريد دفع كلفتها عند الإقلاع).
 
-# ========= بحث وقراءة =========
-from duckduckgo_search import DDGS
-import httpx
-from bs4 import BeautifulSoup
-from readability import Document
+# ========= كاش خفيف (الطبقة المشتركة L1/L2) =========
+from core.cache_layer import cache as _cache_layer
+cache = _cache_layer.namespace("brainv9")
 
-# ========= تلخيص =========
-from sumy.summarizers.lsa import LsaSummarizer
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.parsers.plaintext import PlaintextParser
-
-# ========= ترجمة =========
-try:
-    # غير رسمية لكنها تعمل مجانًا في أغلب الوقت
-    from googletrans import Translator  # type: ignore
-except Exception:
-    Translator = None  # سنتعامل مع عدم وجودها
-
-# ========= ويكيبيديا =========
-import wikipedia
-
-# ========= تحسين صياغة =========
-from rapidfuzz import process, fuzz
-
-# ========= كاش خفيف =========
-from diskcache import Cache
-cache = Cache('/tmp/bassam_cache')
+# الحساب الثقيل (readability / sumy / sympy) في عمليات core/compute بمهلة
+from core import compute
 
 # سجل بسيط للجلسة
 memory_log: List[dict] = []
 
-# إعداد ويكيبيديا
-wikipedia.set_rate_limiting(True)
-wikipedia.set_lang("ar")
+_wikipedia_mod = None
+
+def _wikipedia():
+    """استيراد ويكيبيديا وإعدادها مرة واحدة عند أول استخدام"""
+    global _wikipedia_mod
+    if _wikipedia_mod is None:
+        import wikipedia
+        wikipedia.set_rate_limiting(True)
+        wikipedia.set_lang("ar")
+        _wikipedia_mod = wikipedia
+    return _wikipedia_mod
 
 # =========================================
 # نقطة الدخول
@@ -62,24 +51,40 @@ def safe_run(query: str) -> str:
     """
     يأخذ سؤال المستخدم ويعيد إجابة عربية محادثية قدر الإمكان.
     """
+    answer = ""
+    for ev, data in safe_run_stream(query):
+        if ev == "final":
+            answer = data["answer"]
+    return answer
+
+
+def safe_run_stream(query: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    نفس safe_run لكن على مراحل (intent → sources → partial → final) للبث عبر SSE.
+    """
     memory_log.append({"time": datetime.now(), "query": query})
     q = (query or "").strip()
     if not q:
-        return "✍️ اكتب سؤالك أولاً."
+        yield "final", {"answer": "✍️ اكتب سؤالك أولاً."}
+        return
 
     # هل رياضيات؟
     if looks_like_math(q):
-        return _answer_math(q)
+        yield "intent", {"intent": "math"}
+        yield "final", {"answer": _answer_math(q)}
+        return
 
     # غير رياضيات → بحث وفهم
     # طبّق تحسين/تصحيح بسيط للصياغة
     q_norm = normalize_query(q)
+    yield "intent", {"intent": "search", "query": q_norm}
 
     # جرّب كاش
     ck = f"brainv9::{q_norm}"
     cached = cache.get(ck)
     if cached:
-        return cached
+        yield "final", {"answer": cached, "cached": True}
+        return
 
     # 1) ويكيبيديا أولاً (سريعة ومفيدة للأسئلة التعريفية)
     wiki_text = fetch_wikipedia(q_norm)
@@ -89,18 +94,27 @@ def safe_run(query: str) -> str:
     if wiki_text:
         parts.append(wiki_text["text"])
         sources.append(("ويكيبيديا", wiki_text["url"]))
+        yield "sources", {"stage": "wikipedia", "sources": [{"title": "ويكيبيديا", "url": wiki_text["url"]}]}
+        yield "partial", {"stage": "wikipedia", "summary": wiki_text["text"]}
 
     # 2) بحث ويب عام (يشمل سوشيال عبر النتائج)
-    web_summary, web_sources = web_search_and_summarize(q_norm, want_social=True, max_results=6)
+    web_summary = ""
+    for ev, data in web_search_stages(q_norm, want_social=True, max_results=6):
+        if ev == "summary":
+            web_summary, web_sources = data["summary"], data["sources"]
+        else:
+            yield ev, data
     if web_summary:
         parts.append(web_summary)
         sources.extend(web_sources)
+        yield "partial", {"stage": "web", "summary": web_summary}
 
     # 3) دمج وتجميل + ترجمة للعربية إذا لزم
     if not parts:
         final = "🔎 لم أعثر على نتائج دقيقة، جرّب أن تصيغ سؤالك بجملة أوضح أو أضف كلمات مفتاحية."
-        cache.set(ck, final, expire=60*10)
-        return final
+        cache.set(ck, final, ttl=60*10)
+        yield "final", {"answer": final}
+        return
 
     merged = "\n\n".join(parts)
     merged_ar = ensure_arabic(merged)
@@ -111,8 +125,8 @@ def safe_run(query: str) -> str:
         f"🔗 **مصادر (مختارة):**\n{sources_txt}"
     )
 
-    cache.set(ck, answer, expire=60*30)
-    return answer
+    cache.set(ck, answer, ttl=60*30)
+    yield "final", {"answer": answer}
 
 
 # =========================================
@@ -132,6 +146,14 @@ def looks_like_math(q: str) -> bool:
     return any(re.search(p, q) for p in patterns)
 
 def _answer_math(q: str) -> str:
+    try:
+        return compute.run(_solve_math, q, timeout=compute.MATH_TIMEOUT)
+    except compute.ComputeTimeout:
+        return f"⚠️ المسألة تحتاج وقتًا أطول من المسموح.\n{MATH_HINT}"
+
+
+def _solve_math(q: str) -> str:
+    from sympy import symbols, Eq, sympify, solve
     x, y, z = symbols('x y z')
     try:
         if "=" in q:
@@ -177,6 +199,10 @@ def normalize_query(q: str) -> str:
 # ويكيبيديا
 # =========================================
 def fetch_wikipedia(q: str) -> Optional[Dict[str, str]]:
+    try:
+        wikipedia = _wikipedia()
+    except Exception:
+        return None
     try:
         # عربي أولاً
         wikipedia.set_lang("ar")
@@ -206,6 +232,17 @@ def fetch_wikipedia(q: str) -> Optional[Dict[str, str]]:
 SOCIAL_SITES = ["reddit.com", "stackexchange.com", "stackoverflow.com", "medium.com", "quora.com", "youtube.com", "x.com", "twitter.com"]
 
 def web_search_and_summarize(query: str, want_social: bool = True, max_results: int = 6) -> Tuple[str, List[Tuple[str, str]]]:
+    for ev, data in web_search_stages(query, want_social=want_social, max_results=max_results):
+        if ev == "summary":
+            return data["summary"], data["sources"]
+    return "", []
+
+
+def web_search_stages(query: str, want_social: bool = True, max_results: int = 6) -> Iterator[Tuple[str, Dict]]:
+    """
+    مراحل البحث: حدث sources لكل صفحة مقبولة فور جلبها، ثم حدث summary في النهاية.
+    """
+    from duckduckgo_search import DDGS
     texts: List[str] = []
     sources: List[Tuple[str, str]] = []
 
@@ -216,7 +253,7 @@ def web_search_and_summarize(query: str, want_social: bool = True, max_results:
         results = []
 
     if not results:
-        return "", []
+        return
 
     # فضّل النتائج الغنية بالمحتوى
     for r in results:
@@ -234,77 +271,99 @@ def web_search_and_summarize(query: str, want_social: bool = True, max_results:
         if txt and len(txt.split()) >= 60:
             texts.append(txt)
             sources.append((title, url))
+            yield "sources", {"stage": "web", "sources": [{"title": sanitize_title(title), "url": url}]}
 
     if not texts:
-        return "", []
+        return
 
     summary = summarize_texts(texts, sentences=5)
-    return summary, sources
+    yield "summary", {"summary": summary, "sources": sources}
 
 
 def fetch_page_text(url: str, social: bool = False) -> str:
     """
     تحميل الصفحة واستخراج نص نظيف بقدر الإمكان.
     - social=True: نحاول إبقاء الوصف/المحتوى القصير للمشاركات.
+    النص النهائي (بعد الترجمة) محفوظ في core/page_cache ويُعاد التحقق منه بطلب مشروط.
     """
+    from core.page_cache import cached_text
+    from core.html_extract import Collector, EXTRACT_MAX_BYTES, route
+    col = Collector()
     try:
-        headers = {"User-Agent": "Mozilla/5.0 (BassamBot)"}
-        with httpx.Client(timeout=20.0, headers=headers, follow_redirects=True) as client:
-            r = client.get(url)
-            r.raise_for_status()
-
-        # لو يوتيوب: خذ الوصف على الأقل
-        if "youtube.com" in url or "youtu.be" in url:
-            soup = BeautifulSoup(r.text, "lxml")
-            desc = soup.find("meta", {"name": "description"})
-            if desc and desc.get("content"):
-                return f"وصف فيديو يوتيوب: {desc['content']}"
-            # احتياطي
-            og_desc = soup.find("meta", {"property": "og:description"})
-            if og_desc and og_desc.get("content"):
-                return f"وصف فيديو يوتيوب: {og_desc['content']}"
-
-        # مواقع نقاش: خذ فقرة المحتوى الرئيسية إن أمكن
-        if social and ("reddit.com" in url or "stack" in url or "quora.com" in url or "medium.com" in url):
-            soup = BeautifulSoup(r.text, "lxml")
-            # وصف/مقتطفات عامة
-            og_desc = soup.find("meta", {"property": "og:description"})
-            if og_desc and og_desc.get("content"):
-                return og_desc["content"]
-            desc = soup.find("meta", {"name": "description"})
-            if desc and desc.get("content"):
-                return desc["content"]
-
-        # عام: استخرج متن الصفحة عبر readability
-        doc = Document(r.text)
-        html = doc.summary()
-        soup = BeautifulSoup(html, "lxml")
-        for tag in soup(["script", "style", "header", "footer", "nav", "aside"]):
-            tag.decompose()
-        text = " ".join(soup.get_text(separator=" ").split())
-        # ترجمة للعربية إذا لزم
-        text = ensure_arabic(text)
-        return text
+        # PDF → مستخرج PDF، الملفات الثنائية تُتجاوز، و HTML فقط يصل _extract_page_text
+        return cached_text(url, lambda r: route(r, lambda r: _extract_page_text(r, url, social, col)),
+                           kind="brain-social" if social else "brain", timeout=20.0,
+                           max_bytes=EXTRACT_MAX_BYTES, sink=col)
     except Exception:
         return ""
 
 
+def _extract_page_text(r, url: str, social: bool, col) -> str:
+    from bs4 import BeautifulSoup
+    from core.html_extract import main_text
+    # لو يوتيوب: خذ الوصف على الأقل
+    if "youtube.com" in url or "youtu.be" in url:
+        soup = BeautifulSoup(r.text, "lxml")
+        desc = soup.find("meta", {"name": "description"})
+        if desc and desc.get("content"):
+            return f"وصف فيديو يوتيوب: {desc['content']}"
+        # احتياطي
+        og_desc = soup.find("meta", {"property": "og:description"})
+        if og_desc and og_desc.get("content"):
+            return f"وصف فيديو يوتيوب: {og_desc['content']}"
+
+    # مواقع نقاش: خذ فقرة المحتوى الرئيسية إن أمكن
+    if social and ("reddit.com" in url or "stack" in url or "quora.com" in url or "medium.com" in url):
+        soup = BeautifulSoup(r.text, "lxml")
+        # وصف/مقتطفات عامة
+        og_desc = soup.find("meta", {"property": "og:description"})
+        if og_desc and og_desc.get("content"):
+            return og_desc["content"]
+        desc = soup.find("meta", {"name": "description"})
+        if desc and desc.get("content"):
+            return desc["content"]
+
+    # عام: فقرات المتن المجموعة أثناء التنزيل، أو readability إن لم تكفِ
+    text = " ".join(main_text(r, col, lambda r: compute.run(_readability_text, r.text)).split())
+    # ترجمة للعربية إذا لزم
+    text = ensure_arabic(text)
+    return text
+
+
+def _readability_text(html_text: str) -> str:
+    from bs4 import BeautifulSoup
+    from readability import Document
+    doc = Document(html_text)
+    html = doc.summary()
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup(["script", "style", "header", "footer", "nav", "aside"]):
+        tag.decompose()
+    return soup.get_text(separator=" ")
+
+
 def summarize_texts(texts: List[str], sentences: int = 5) -> str:
     # اجمع النصوص
     joined = "\n\n".join(texts)
     try:
-        parser = PlaintextParser.from_string(joined, Tokenizer("arabic"))
-        summarizer = LsaSummarizer()
-        sents = summarizer(parser.document, sentences)
-        summary = " ".join(str(s) for s in sents)
-        if len(summary.strip()) < 20:
-            raise ValueError("summary too short")
-        return summary
+        return compute.run(_lsa_summary, joined, sentences)
     except Exception:
         # احتياطي: خذ أول 700 حرف
         return (joined[:700] + "…") if len(joined) > 700 else joined
 
 
+def _lsa_summary(joined: str, sentences: int) -> str:
+    from sumy.summarizers.lsa import LsaSummarizer
+    from sumy.nlp.tokenizers import Tokenizer
+    from sumy.parsers.plaintext import PlaintextParser
+    parser = PlaintextParser.from_string(joined, Tokenizer("arabic"))
+    summarizer = LsaSummarizer()
+    sents = summarizer(parser.document, sentences)
+    summary = " ".join(str(s) for s in sents)
+    if len(summary.strip()) < 20:
+        raise ValueError("summary too short")
+    return summary
+
+
 # =========================================
 # ترجمة/لغة
 # =========================================
@@ -321,7 +380,10 @@ def translate_to_ar(text: str) -> str:
     if not text:
         return text
     try:
-        if Translator is None:
+        try:
+            # غير رسمية لكنها تعمل مجانًا في أغلب الوقت
+            from googletrans import Translator  # type: ignore
+        except Exception:
             return text  # لا يوجد مترجم مثبت
         tr = Translator()
         out = tr.translate(text, dest="ar")
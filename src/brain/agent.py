@@ -8,7 +8,9 @@ from typing import List
 # بحث ويب مجاني
 from duckduckgo_search import DDGS
 from bs4 import BeautifulSoup
-import httpx
+
+from core import fetcher
+from core.html_extract import route
 
 # --- أدوات مساعدة ---
 
@@ -75,18 +77,17 @@ def _is_search(q: str) -> bool:
 
 def _fetch_text(url: str, timeout=8) -> str:
     try:
-        with httpx.Client(timeout=timeout, follow_redirects=True) as client:
-            r = client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "lxml")
-            # نأخذ نصًا نظيفًا ومختصرًا
-            for s in soup(["script", "style", "noscript"]):
-                s.extract()
-            text = " ".join(soup.get_text(" ").split())
-            return text[:4000]
+        return route(fetcher.fetch_sync(url, timeout=timeout), _html_text)[:4000]
     except Exception:
         return ""
 
+def _html_text(page) -> str:
+    soup = BeautifulSoup(page.text, "lxml")
+    # نأخذ نصًا نظيفًا ومختصرًا
+    for s in soup(["script", "style", "noscript"]):
+        s.extract()
+    return " ".join(soup.get_text(" ").split())
+
 def _summarize(snippets: List[str], limit_chars=400) -> str:
     text = " ".join([s for s in snippets if s]).strip()
     if not text:
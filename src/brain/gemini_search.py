@@ -1,4 +1,4 @@
-import os, re, httpx
+import os, re
 from typing import List, Dict
 
 import google.generativeai as genai
@@ -6,6 +6,9 @@ from duckduckgo_search import DDGS
 from readability import Document
 from bs4 import BeautifulSoup
 
+from core import fetcher
+from core.html_extract import route
+
 # ===== إعداد Gemini =====
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_KEY:
@@ -14,13 +17,6 @@ if GEMINI_KEY:
 else:
     GEMINI_MODEL = None
 
-UA = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
-    )
-}
-
 # ===== البحث المجاني (DuckDuckGo) =====
 def web_search_duckduckgo(q: str, max_n: int = 5) -> List[Dict]:
     with DDGS() as ddgs:
@@ -30,16 +26,17 @@ def web_search_duckduckgo(q: str, max_n: int = 5) -> List[Dict]:
 # ===== جلب وتنظيف الصفحات =====
 def fetch_clean(url: str, timeout: int = 12) -> str:
     try:
-        r = httpx.get(url, headers=UA, timeout=timeout, follow_redirects=True)
-        r.raise_for_status()
-        doc = Document(r.text)
-        html_clean = doc.summary()
-        txt = BeautifulSoup(html_clean, "lxml").get_text("\n", strip=True)
+        txt = route(fetcher.fetch_sync(url, timeout=timeout), _html_text)
         # حد أعلى للنص لحماية النموذج
         return txt[:8000]
     except Exception:
         return ""
 
+def _html_text(page) -> str:
+    doc = Document(page.text)
+    html_clean = doc.summary()
+    return BeautifulSoup(html_clean, "lxml").get_text("\n", strip=True)
+
 # ===== استدعاء Gemini =====
 def answer_with_gemini(prompt: str) -> str:
     if not GEMINI_MODEL:
@@ -1,7 +1,12 @@
 # src/memory/memory.py — ذاكرة بسيطة على diskcache
+# ذاكرة المستخدم بيانات دائمة لا كاش: مخزن مستقل بلا إخلاء (eviction_policy="none")
+# وخارج core/cache_layer التي تُخلي عناصرها حين تمتلئ ميزانيتها المشتركة
 
+import os
 from diskcache import Cache
-cache = Cache(".cache")
+
+MEMORY_DIR = os.getenv("BRAIN_MEMORY_DIR", ".cache")
+cache = Cache(MEMORY_DIR, eviction_policy="none")
 
 def _key(user_id: str, field: str) -> str:
     return f"user:{user_id}:{field}"
@@ -3,27 +3,14 @@
 
 from __future__ import annotations
 import os, re, math, json, pathlib, html
-from typing import List, Tuple
-
-import httpx
-from bs4 import BeautifulSoup
-from duckduckgo_search import DDGS
-from readability import Document
-from sumy.parsers.plaintext import PlainTextParser
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.summarizers.lex_rank import LexRankSummarizer
-from rank_bm25 import BM25Okapi
-from rapidfuzz import fuzz, process
-import numpy as np
-from diskcache import Cache
-
-# رياضيات
-try:
-    import sympy as sp
-except Exception:
-    sp = None
-
-CACHE = Cache(directory=".cache-omni", size_limit=256 * 1024 * 1024)
+from typing import Dict, Iterator, List, Tuple
+
+# المكتبات الثقيلة (httpx عبر core/fetcher, bs4, readability, sumy, numpy, sympy, DDGS)
+# تُستورد داخل الدوال التي تحتاجها فقط — الإقلاع البارد على Render أسرع بكثير.
+# main.py يسخّنها في الخلفية بعد فتح المنفذ (WARMUP).
+
+from core.singleflight import group
+from core import compute
 
 DATA_DIR = pathlib.Path("data")
 DATA_DIR.mkdir(exist_ok=True)
@@ -39,48 +26,33 @@ def _is_translate(q: str) -> bool:
     return q.strip().lower().startswith(("translate ", "ترجم "))
 
 def _summarize(text: str, sentences: int = 4) -> str:
-    parser = PlainTextParser.from_string(text, Tokenizer("arabic"))
+    # LexRank في عملية من core/compute (لا يحجز GIL خادم الويب)
+    try:
+        return compute.run(_lexrank, text, sentences)
+    except compute.ComputeTimeout:
+        return _clean(text[:600])
+
+def _lexrank(text: str, sentences: int) -> str:
+    from sumy.parsers.plaintext import PlaintextParser
+    from sumy.nlp.tokenizers import Tokenizer
+    from sumy.summarizers.lex_rank import LexRankSummarizer
+    parser = PlaintextParser.from_string(text, Tokenizer("arabic"))
     summ = LexRankSummarizer()
     sents = summ(parser.document, sentences)
     out = " ".join(str(s) for s in sents) or text[:600]
     return _clean(out)
 
 # -------------------- RAG (ملفات محلية) --------------------
-def _load_corpus() -> List[Tuple[str, str]]:
-    docs = []
-    for p in DATA_DIR.glob("**/*"):
-        if p.is_file() and p.suffix.lower() in {".txt", ".md"}:
-            try:
-                docs.append((p.name, p.read_text(encoding="utf-8", errors="ignore")))
-            except Exception:
-                pass
-    return docs
-
+# الفهرس مشترك (src/rag/service.py): يُبنى مرة ويُحدَّث عند تغيّر ملفات data/
+# والمقتطف = أفضل سطر في المقطع من أسطر محسوبة وقت البناء (بلا مسح نصي وقت الاستعلام)
 def _rag_search(query: str, topk: int = 3) -> List[Tuple[str, str]]:
-    corpus = CACHE.get("rag_corpus")
-    if corpus is None:
-        corpus = _load_corpus()
-        CACHE.set("rag_corpus", corpus, expire=600)
-    if not corpus:
-        return []
-
-    texts = [c[1] for c in corpus]
-    tokenized = [t.split() for t in texts]
-    bm25 = BM25Okapi(tokenized)
-    scores = bm25.get_scores(query.split())
-    idxs = np.argsort(scores)[::-1][:topk]
-    results = []
-    for i in idxs:
-        title, body = corpus[int(i)]
-        # أفضل مقطع قريب للسؤال
-        lines = [l.strip() for l in body.splitlines() if l.strip()]
-        best, _ = process.extractOne(query, lines, scorer=fuzz.WRatio) if lines else ("", 0)
-        snippet = best or body[:400]
-        results.append((title, snippet))
-    return results
+    from src.rag.service import get_index
+    return [(os.path.basename(h["source"]), h.get("snippet") or h["text"][:400])
+            for h in get_index("data").query(query, top_k=topk, snippets=True)]
 
 # -------------------- البحث من الويب --------------------
 def _duckduckgo(query: str, n=4) -> List[dict]:
+    from duckduckgo_search import DDGS
     out = []
     try:
         with DDGS() as ddgs:
@@ -91,31 +63,48 @@ def _duckduckgo(query: str, n=4) -> List[dict]:
     return out
 
 def _fetch_page(url: str, timeout=15) -> str:
+    # نفس الرابط من عدة طلبات متزامنة → جلب واحد
+    return group("page").do(url.strip(), _fetch_page_once, url, timeout)
+
+def _fetch_page_once(url: str, timeout=15) -> str:
+    # النص المستخرج محفوظ (core/page_cache): الصفحة غير المتغيرة لا تُنزَّل ولا تُحلَّل ثانية
+    # والتنزيل يتوقف حين تكفي فقرات المتن (core/html_extract)
+    from core.page_cache import cached_text
+    from core.html_extract import Collector, EXTRACT_MAX_BYTES, main_text, route
+    col = Collector()
     try:
-        with httpx.Client(follow_redirects=True, timeout=timeout) as client:
-            r = client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-            r.raise_for_status()
-            html_text = r.text
-            doc = Document(html_text)
-            content = doc.summary(html_partial=True)
-            text = BeautifulSoup(content, "html.parser").get_text(" ")
-            return _clean(text)
+        readability = lambda page: compute.run(_readability_text, page.text)
+        html_text = lambda page: main_text(page, col, readability)
+        return cached_text(url, lambda page: _clean(route(page, html_text)), kind="omni",
+                           timeout=timeout, max_bytes=EXTRACT_MAX_BYTES, sink=col)
     except Exception:
         return ""
 
-def _web_answer(query: str) -> str:
+def _readability_text(html_text: str) -> str:
+    from bs4 import BeautifulSoup
+    from readability import Document
+    doc = Document(html_text)
+    content = doc.summary(html_partial=True)
+    text = BeautifulSoup(content, "html.parser").get_text(" ")
+    return _clean(text)
+
+def _web_stages(query: str) -> Iterator[Tuple[str, Dict]]:
+    """مراحل إجابة الويب: المصادر ثم ملخص جزئي لكل صفحة ثم الإجابة"""
     hits = _duckduckgo(query, n=5)
+    if hits:
+        yield "sources", {"stage": "web", "sources": [{"title": h["title"], "url": h["href"]} for h in hits[:3]]}
     chunks = []
     for h in hits[:3]:
         txt = _fetch_page(h["href"])
         if txt:
             chunks.append(txt)
+            yield "partial", {"stage": "web", "url": h["href"], "summary": _summarize(txt[:1500], sentences=2)}
     if not chunks:
-        return ""
+        return
     joined = "\n\n".join(chunks)[:4000]
     summ = _summarize(joined, sentences=5)
     srcs = "\n".join(f"- {h['title']}: {h['href']}" for h in hits[:3])
-    return f"{summ}\n\nالمصادر:\n{srcs}"
+    yield "answer", {"answer": f"{summ}\n\nالمصادر:\n{srcs}"}
 
 # -------------------- Wikipedia --------------------
 def _wiki_answer(query: str) -> str:
@@ -134,7 +123,15 @@ def _wiki_answer(query: str) -> str:
 
 # -------------------- Math (SymPy) --------------------
 def _math_answer(q: str) -> str:
-    if sp is None:
+    try:
+        return compute.run(_math_solve, q, timeout=compute.MATH_TIMEOUT)
+    except compute.ComputeTimeout:
+        return "المسألة تحتاج وقتًا أطول من المسموح. جرّب صياغة أبسط."
+
+def _math_solve(q: str) -> str:
+    try:
+        import sympy as sp
+    except Exception:
         return "ميزة الرياضيات غير مفعّلة الآن."
     q = q.replace("^", "**").replace("÷", "/").replace("×", "*")
     # أنماط بسيطة: اشتقاق / تكامل / حل معادلة
@@ -185,43 +182,67 @@ def _detect_domain(q: str) -> str:
     return ""
 
 # -------------------- الموجّه الرئيسي --------------------
-def omni_answer(message: str) -> str:
+def omni_stream(message: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    نفس مسار omni_answer لكن على مراحل (للبث عبر SSE):
+    intent → sources → partial → final
+    """
     q = _clean(message)
     if not q:
-        return "اكتب سؤالك…"
+        yield "final", {"answer": "اكتب سؤالك…"}
+        return
+
+    domain = _detect_domain(q)
+    intent = "math" if _is_math(q) else "translate" if _is_translate(q) else "search"
+    yield "intent", {"intent": intent, "domain": domain}
 
     # 1) رياضيات
-    if _is_math(q):
-        return _math_answer(q)
+    if intent == "math":
+        yield "final", {"answer": _math_answer(q)}
+        return
 
     # 2) ترجمة بسيطة: "ترجم hello to arabic" / "translate ..."
-    if _is_translate(q):
+    if intent == "translate":
         text = q.split(" ", 1)[-1]
         # ترجمة بدائية (بدون API) — تفكيك وتفسير بسيط
         # لتجربة أفضل: استخدم مزوّد ترجمة API لاحقًا
-        return f"ترجمة تقريبية: {text}"
+        yield "final", {"answer": f"ترجمة تقريبية: {text}"}
+        return
 
     # 3) RAG من ملفاتك
     rag_hits = _rag_search(q, topk=3)
     if rag_hits:
+        yield "sources", {"stage": "rag", "sources": [{"title": t} for t, _ in rag_hits]}
         joined = "\n\n---\n\n".join(f"[{t}]\n{b}" for t,b in rag_hits)
         summ = _summarize(joined, sentences=5)
-        return f"{summ}\n\n(مصادر محلية: {', '.join(t for t,_ in rag_hits)})"
+        yield "final", {"answer": f"{summ}\n\n(مصادر محلية: {', '.join(t for t,_ in rag_hits)})"}
+        return
 
     # 4) Wikipedia
     wiki = _wiki_answer(q)
     if wiki:
-        return wiki
+        yield "sources", {"stage": "wikipedia", "sources": [{"title": "ويكيبيديا"}]}
+        yield "final", {"answer": wiki}
+        return
 
     # 5) Web Search
-    web = _web_answer(q)
-    if web:
-        return web
+    for ev, data in _web_stages(q):
+        if ev == "answer":
+            yield "final", data
+            return
+        yield ev, data
 
     # 6) رسائل تخصصية/نصيحة عامة
-    domain = _detect_domain(q)
     prefix = _advisor_prefix(domain)
     if prefix:
-        return prefix + "\n" + "أعد صياغة سؤالك بتفاصيل أكثر (مواد، أبعاد، شروط، قيود، مصدر الألم/الهدف…)."
+        yield "final", {"answer": prefix + "\n" + "أعد صياغة سؤالك بتفاصيل أكثر (مواد، أبعاد، شروط، قيود، مصدر الألم/الهدف…)."}
+        return
 
-    return "لم أجد نتائج واضحة لسؤالك. جرّب صياغة أبسط أو كلمات مفتاحية مختلفة."
+    yield "final", {"answer": "لم أجد نتائج واضحة لسؤالك. جرّب صياغة أبسط أو كلمات مفتاحية مختلفة."}
+
+def omni_answer(message: str) -> str:
+    answer = ""
+    for ev, data in omni_stream(message):
+        if ev == "final":
+            answer = data["answer"]
+    return answer
@@ -4,29 +4,30 @@
 يسمح بجلب المعرفة من الويب، ويكيبيديا، ويوتيوب ورديت عند توفر المفاتيح.
 """
 
-import httpx
+from core import fetcher
+from core.html_extract import route
 from duckduckgo_search import DDGS
 from bs4 import BeautifulSoup
 from readability import Document
 
 # ============== جلب النص من الإنترنت ==============
 def fetch_text(url: str) -> str:
-    """يحاول استخراج النص النظيف من أي صفحة"""
+    """يحاول استخراج النص النظيف من أي صفحة (أو ملف PDF)"""
     try:
-        with httpx.Client(timeout=15.0, headers={"User-Agent": "Mozilla/5.0"}) as c:
-            r = c.get(url, follow_redirects=True)
-            r.raise_for_status()
-        doc = Document(r.text)
-        html = doc.summary()
-        soup = BeautifulSoup(html, "lxml")
-        for tag in soup(["script", "style", "header", "footer", "nav"]):
-            tag.decompose()
-        text = " ".join(soup.get_text(separator=" ").split())
-        return text
+        return route(fetcher.fetch_sync(url, timeout=15.0), _html_text)
     except Exception:
         return ""
 
 
+def _html_text(page) -> str:
+    doc = Document(page.text)
+    html = doc.summary()
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup(["script", "style", "header", "footer", "nav"]):
+        tag.decompose()
+    return " ".join(soup.get_text(separator=" ").split())
+
+
 # ============== البحث عبر DuckDuckGo ==============
 def connector_duckduckgo(query: str, max_results: int = 5):
     """بحث ويب عام"""
@@ -0,0 +1,412 @@
+# src/rag/chunk_index.py — فهرس BM25 على مستوى المقاطع (passages) مع لقطة محفوظة على القرص
+# - كل ملف يُقطّع إلى مقاطع بإزاحات (start, end) داخل نصه الأصلي
+# - الفهرس يُبنى مرة واحدة ويُحفظ كلقطة بإصدار (INDEX_VERSION)؛ الإقلاع التالي يحمّلها مباشرة
+# - تغيّر بصمة الملفات (المسار + mtime + الحجم) يُطبَّق كدلتا لكل ملف دون إعادة بناء كاملة،
+#   ويُفحص ذلك كل RAG_REFRESH_SECS أو فورًا عبر المراقب (watcher.py)
+# - التقييم BM25 عبر فهرس مقلوب مضغوط (inverted.py): كلفة الاستعلام تتبع قوائم كلمات
+#   السؤال فقط، مع تقليم MaxScore لقوائم الكلمات الشائعة
+# - passages=True: أسطر كل مقطع (إزاحاتها + أرقام كلماتها) تُحسب وقت البناء، فاختيار
+#   المقتطف وقت الاستعلام = قراءة مصفوفات + تقييم متجهي لأسطر المقاطع الناتجة فقط
+# - على القرص: نصوص المقاطع وكل المصفوفات في ملف .bin يُقرأ عبر mmap (text_store.py)؛
+#   العمال يتشاركون الصفحات ولا يبقى في ذاكرة العملية إلا القاموس وقائمة الملفات
+# - المقاطع شبه المكررة (dedup.py) تُفهرس مرة واحدة، والبقية أسماء بديلة في "aliases"
+from __future__ import annotations
+import os, re, glob, pickle, threading, time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.rag.inverted import InvertedIndex
+from src.rag.text_store import TextStore, open_blob, pack_texts, write_blob
+
+INDEX_VERSION = 9
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "cache")
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "700"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "80"))
+REFRESH_SECS = float(os.getenv("RAG_REFRESH_SECS", "30"))
+COMPACT_RATIO = float(os.getenv("RAG_COMPACT_RATIO", "0.1"))
+COMPACT_MIN = int(os.getenv("RAG_COMPACT_MIN", "2000"))
+
+TEXT_PATTERNS = ("*.txt","*.md","*.rst","*.html","*.htm","*.log","*.csv","*.tsv","*.json","*.yml","*.yaml","*.ini","*.pdf")
+
+Fingerprint = List[Tuple[str, int, int]]
+
+
+# -------------------- قراءة الملفات --------------------
+def read_text_file(fp: str) -> str:
+    try:
+        with open(fp, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except Exception:
+        return ""
+
+def read_pdf_file(fp: str) -> str:
+    # استخراج متوازٍ مع spool ونقاط استئناف (pdf_ingest.py)
+    from src.rag.pdf_ingest import read_pdf
+    return read_pdf(fp)
+
+def read_file(fp: str) -> str:
+    return read_pdf_file(fp) if fp.lower().endswith(".pdf") else read_text_file(fp)
+
+
+# -------------------- تقطيع وترميز --------------------
+def tokenize_ar(s: str) -> List[str]:
+    s = re.sub(r"[^\w\u0600-\u06FF]+", " ", s)
+    return s.lower().split()
+
+def chunk_spans(text: str, n: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """إزاحات المقاطع داخل النص؛ تُقصّ النهاية عند آخر مسافة حتى لا تُقطع الكلمات."""
+    spans, i, L = [], 0, len(text)
+    while i < L:
+        end = min(i + n, L)
+        if end < L:
+            cut = text.rfind(" ", i + n // 2, end)
+            if cut > i:
+                end = cut
+        if text[i:end].strip():
+            spans.append((i, end))
+        if end >= L:
+            break
+        i = max(end - overlap, i + 1)
+    return spans
+
+def forget_file(fp: str) -> None:
+    """ملف خرج من المدونة: يحذف ما خُزّن له خارج الفهارس (spool ونقطة استئناف PDF)"""
+    if fp.lower().endswith(".pdf"):
+        from src.rag.pdf_ingest import forget
+        forget(fp)
+
+def iter_file_chunks(fp: str) -> Iterator[Tuple[int, int, str]]:
+    """مقاطع الملف (بداية، نهاية، نص)؛ ملفات PDF تُقطَّع صفحةً صفحة دون تجميع نصها كاملًا"""
+    if fp.lower().endswith(".pdf"):
+        from src.rag.pdf_ingest import iter_chunks
+        yield from iter_chunks(fp)
+        return
+    txt = read_text_file(fp)
+    for s, e in chunk_spans(txt):
+        yield s, e, txt[s:e]
+
+
+# -------------------- أسطر المقاطع (للمقتطفات) --------------------
+_PASSAGE_KEYS = ("pass_ptr", "pass_span", "ptok_ptr", "ptok_ids")
+_LINE_RE = re.compile(r"[^\n]*\S[^\n]*")
+
+def build_passages(texts: Sequence[str], vocab: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """
+    تخزين CSR: أسطر المقطع i هي [pass_ptr[i], pass_ptr[i+1]) وإزاحة كل سطر داخل نص مقطعه
+    في pass_span، وكلمات السطر j هي ptok_ids[ptok_ptr[j]:ptok_ptr[j+1]] (أرقام من vocab الفهرس)
+    """
+    pass_ptr, spans, ptok_ptr, ptok = [0], [], [0], []
+    for t in texts:
+        for m in _LINE_RE.finditer(t):
+            line = m.group()
+            lead = len(line) - len(line.lstrip())
+            spans.append((m.start() + lead, m.start() + len(line.rstrip())))
+            ptok.extend(vocab[w] for w in tokenize_ar(line) if w in vocab)
+            ptok_ptr.append(len(ptok))
+        pass_ptr.append(len(spans))
+    return {
+        "pass_ptr": np.asarray(pass_ptr, dtype=np.int64),
+        "pass_span": np.asarray(spans, dtype=np.int32).reshape(-1, 2),
+        "ptok_ptr": np.asarray(ptok_ptr, dtype=np.int64),
+        "ptok_ids": np.asarray(ptok, dtype=np.int32),
+    }
+
+def best_passage(seg: Dict, i: int, q_tokens: Sequence[str], max_chars: int = 400) -> str:
+    """أفضل سطر في المقطع i: مجموع idf لكلمات السؤال فيه مع عقوبة طول خفيفة"""
+    text = seg["texts"][i]
+    a, b = int(seg["pass_ptr"][i]), int(seg["pass_ptr"][i + 1])
+    if a == b:
+        return text[:max_chars]
+    bm25 = seg["bm25"]
+    q = np.fromiter({bm25.vocab[w] for w in q_tokens if w in bm25.vocab}, dtype=np.int32)
+    ptr = seg["ptok_ptr"][a:b + 1]
+    ids = seg["ptok_ids"][ptr[0]:ptr[-1]]
+    lens = np.diff(ptr)
+    if len(q) and len(ids):
+        w = np.where(np.isin(ids, q), bm25.idf[ids], 0.0)
+        csum = np.concatenate([[0.0], np.cumsum(w)])
+        matched = csum[ptr[1:] - ptr[0]] - csum[ptr[:-1] - ptr[0]]
+        score = matched / (1.0 + 0.05 * lens)
+        j = int(np.argmax(score))
+    else:
+        j = 0
+    s, e = seg["pass_span"][a + j]
+    return text[s:e]
+
+
+# -------------------- الفهرس --------------------
+class ChunkIndex:
+    """
+    لقطة أساسية (محفوظة على القرص) + دلتا في الذاكرة:
+      - الدلتا = فهرس صغير لكل ملف جديد/متغيّر منذ اللقطة، مع حجب مقاطع الملفات
+        المتغيّرة/المحذوفة من اللقطة؛ تُعاد بناؤها من تلك الملفات فقط عند كل تغيير
+      - عندما تكبر الدلتا (RAG_COMPACT_RATIO من حجم اللقطة) يُعاد بناء اللقطة وحفظها
+    """
+
+    def __init__(self, name: str, roots: Sequence[str], patterns: Sequence[str] = TEXT_PATTERNS,
+                 passages: bool = False):
+        self.name = name
+        self.roots = list(roots)
+        self.patterns = tuple(patterns)
+        self.passages = passages
+        self.path = os.path.join(INDEX_DIR, f"rag_{name}.v{INDEX_VERSION}.pkl")
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # إعادة بناء كاملة واحدة في كل مرة، خارج _lock
+        self._snap: Optional[Dict] = None
+        self._delta: Optional[Dict] = None
+        self._fingerprint: Optional[Fingerprint] = None
+        self._checked = 0.0
+
+    # ---------- الملفات وبصمتها ----------
+    def list_files(self) -> List[str]:
+        files = set()
+        for root in self.roots:
+            for pat in self.patterns:
+                files.update(glob.glob(os.path.join(root, "**", pat), recursive=True))
+        return sorted(f for f in files if os.path.isfile(f))
+
+    def fingerprint(self) -> Fingerprint:
+        fp = []
+        for f in self.list_files():
+            try:
+                st = os.stat(f)
+                fp.append((f, st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+        return fp
+
+    # ---------- البناء والحفظ ----------
+    def _segment(self, paths: Sequence[str], base: Optional[InvertedIndex] = None) -> Dict:
+        from src.rag.dedup import DEDUP, Deduper
+        files: List[str] = []
+        chunks: List[Tuple[int, int, int]] = []   # (رقم الملف، بداية، نهاية)
+        texts: List[str] = []
+        ranges: List[Tuple[int, int]] = []        # مقاطع كل ملف المفهرسة متجاورة: [a, b)
+        aliases: List[Tuple[int, int, int, int]] = []  # (المقطع الأصلي، رقم الملف، بداية، نهاية)
+        dd = Deduper() if DEDUP else None
+        for fp in paths:
+            fi, a = len(files), len(chunks)
+            dups = []
+            for s, e, t in iter_file_chunks(fp):
+                canon = dd.check(len(chunks), t) if dd else None
+                if canon is None:
+                    chunks.append((fi, s, e))
+                    texts.append(t)
+                else:
+                    dups.append((canon, fi, s, e))
+            if len(chunks) > a or dups:
+                files.append(fp)
+                ranges.append((a, len(chunks)))
+                aliases.extend(dups)
+        toks = [tokenize_ar(t) for t in texts]
+        al = np.asarray(aliases, dtype=np.int64).reshape(-1, 4)
+        seg = {"files": files, "chunks": np.asarray(chunks, dtype=np.int64).reshape(-1, 3), "texts": texts,
+               "ranges": np.asarray(ranges, dtype=np.int64).reshape(-1, 2),
+               "aliases": al[np.argsort(al[:, 0], kind="stable")],
+               "dedup": dd.report() if dd else None,
+               "bm25": InvertedIndex.build(toks, base=base)}
+        if dd and dd.dups:
+            r = dd.report()
+            print(f"[RAG] {self.name}: {r['dup_chunks']} مقطعًا مكررًا لم يُفهرس من {r['chunks_seen']} "
+                  f"({r['dup_bytes'] / 1e6:.2f} MB نص، {r['bytes_saved_ratio']:.1%})")
+        if self.passages:
+            seg.update(build_passages(texts, seg["bm25"].vocab))
+        return seg
+
+    def _build(self, fingerprint: Fingerprint) -> Dict:
+        snap = self._segment([fp for fp, _, _ in fingerprint])
+        snap.update(version=INDEX_VERSION, fingerprint=fingerprint, built_at=time.time())
+        return snap
+
+    def _save(self, snap: Dict) -> bool:
+        """
+        اللقطة = ملف .pkl صغير (الملفات، البصمة، القاموس) + ملف .bin بكل المصفوفات ونصوص المقاطع.
+        اسم .bin فريد لكل بناء: من فتح النسخة السابقة بـ mmap يبقى عليها حتى يعيد التحميل.
+        يعيد False إن فشل الحفظ (قرص ممتلئ، cache للقراءة فقط ...).
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            text_bytes, text_off = pack_texts(snap["texts"])
+            arrays = {"chunks": snap["chunks"], "ranges": snap["ranges"], "aliases": snap["aliases"],
+                      "text_bytes": text_bytes, "text_off": text_off}
+            arrays.update({"bm25." + k: v for k, v in snap["bm25"].arrays().items()})
+            arrays.update({k: snap[k] for k in _PASSAGE_KEYS if k in snap})
+            blob = f"{self.path[:-4]}.{os.getpid()}.{time.time_ns()}.bin"
+            layout = write_blob(blob, arrays)
+            meta = {k: snap[k] for k in ("version", "fingerprint", "files", "built_at", "dedup")}
+            meta.update(bm25=snap["bm25"].meta(), blob=os.path.basename(blob), layout=layout)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)  # ذرّي: لا يرى عامل آخر ملفًا نصف مكتوب
+            for old in glob.glob(f"{glob.escape(self.path[:-4])}.*.bin"):
+                if old != blob:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+        except Exception as e:
+            print(f"[RAG] لم يتم حفظ لقطة الفهرس {self.name}: {e}")
+            return False
+        return True
+
+    def _load(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "rb") as f:
+                meta = pickle.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            arrays = open_blob(os.path.join(os.path.dirname(self.path), meta.pop("blob")), meta.pop("layout"))
+        except Exception:
+            return None
+        snap = dict(meta)
+        snap["bm25"] = InvertedIndex.from_arrays(meta["bm25"], {k[5:]: v for k, v in arrays.items() if k.startswith("bm25.")})
+        snap["texts"] = TextStore(arrays["text_bytes"], arrays["text_off"])
+        snap["chunks"], snap["ranges"], snap["aliases"] = arrays["chunks"], arrays["ranges"], arrays["aliases"]
+        snap.update({k: arrays[k] for k in _PASSAGE_KEYS if k in arrays})
+        return snap
+
+    def _make_delta(self, snap: Dict, fingerprint: Fingerprint) -> Optional[Dict]:
+        """دلتا الملفات المختلفة عن اللقطة، أو None إذا وجب إعادة بناء اللقطة"""
+        base = {f: (m, s) for f, m, s in snap["fingerprint"]}
+        now = {f: (m, s) for f, m, s in fingerprint}
+        dirty = [f for f in now if base.get(f) != now[f]]        # جديدة أو متغيّرة
+        gone = {f for f in base if now.get(f) != base[f]}        # متغيّرة أو محذوفة
+        for f in gone:
+            if f not in now:
+                forget_file(f)
+        # ملفات مكرراتها تشير إلى مقاطع ملف محجوب تفقد من يمثلها → تُعاد فهرستها أيضًا
+        al = snap["aliases"]
+        while len(al) and gone:
+            gone_fi = [fi for fi, f in enumerate(snap["files"]) if f in gone]
+            hit = np.isin(snap["chunks"][al[:, 0], 0], gone_fi)
+            extra = {snap["files"][fi] for fi in np.unique(al[hit, 1])} - gone
+            if not extra:
+                break
+            gone |= extra
+            dirty += [f for f in extra if f in now]
+        if not dirty and not gone:
+            return {"files": [], "chunks": np.zeros((0, 3), dtype=np.int64), "texts": [],
+                    "ranges": np.zeros((0, 2), dtype=np.int64), "aliases": np.zeros((0, 4), dtype=np.int64),
+                    "bm25": None, "masked": None, "n_masked": 0}
+        mask = np.zeros(len(snap["chunks"]), dtype=bool)
+        for fi, f in enumerate(snap["files"]):
+            if f in gone:
+                a, b = snap["ranges"][fi]
+                mask[a:b] = True
+        delta = self._segment(dirty, base=snap["bm25"])
+        delta["masked"], delta["n_masked"] = mask, int(mask.sum())
+        limit = max(COMPACT_MIN, COMPACT_RATIO * len(snap["chunks"]))
+        if len(delta["chunks"]) + delta["n_masked"] > limit:
+            return None
+        return delta
+
+    def _apply(self, fingerprint: Fingerprint) -> bool:
+        """
+        يطبّق بصمة الملفات الحالية داخل القفل: لا شيء، أو دلتا. False إن وجبت إعادة بناء كاملة
+        (تُنفَّذ خارج القفل عبر _rebuild).
+        """
+        if self._snap is not None and self._fingerprint == fingerprint:
+            return True
+        snap = self._snap or self._load()
+        delta = self._make_delta(snap, fingerprint) if snap is not None else None
+        if delta is None:
+            return False
+        self._snap, self._delta, self._fingerprint = snap, delta, fingerprint
+        return True
+
+    def _rebuild(self, fingerprint: Fingerprint) -> None:
+        """إعادة بناء كاملة خارج self._lock (داخل _build_lock)؛ اللقطة الجديدة تُبدَّل تحت القفل"""
+        if self._fingerprint == fingerprint:
+            return  # بناها خيط آخر بينما ننتظر
+        snap = self._build(fingerprint)
+        # نفس اللقطة لكن فوق mmap بدل قوائم بايثون — فقط إن حُفظت، وإلا فما على القرص أقدم منها
+        if self._save(snap):
+            snap = self._load() or snap
+        delta = self._make_delta(snap, fingerprint)
+        with self._lock:
+            self._snap, self._delta, self._fingerprint = snap, delta, fingerprint
+
+    def ensure(self) -> Tuple[Dict, Dict]:
+        """
+        (اللقطة، الدلتا) الحاليتان: من الذاكرة، أو من القرص + دلتا للملفات المتغيّرة.
+        فحص البصمة (stat فقط) لا يتكرر أكثر من مرة كل REFRESH_SECS؛ المراقب (watcher.py)
+        يستدعي refresh() فور أي تغيير. إعادة البناء الكاملة لا تحجب الاستعلامات: تجري في خيط
+        خلفي والاستعلامات تُخدم من اللقطة والدلتا القديمتين (ولا تنتظر إلا إن لم توجد لقطة بعد).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._snap is not None and now - self._checked < REFRESH_SECS:
+                return self._snap, self._delta
+            self._checked = now
+            fingerprint = self.fingerprint()
+            cold = self._snap is None
+            if self._apply(fingerprint):
+                return self._snap, self._delta
+        if cold:
+            with self._build_lock:
+                self._rebuild(fingerprint)
+        elif self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_bg, args=(fingerprint,), name=f"rag-rebuild-{self.name}",
+                             daemon=True).start()
+        with self._lock:
+            return self._snap, self._delta
+
+    def _rebuild_bg(self, fingerprint: Fingerprint) -> None:
+        try:
+            self._rebuild(fingerprint)
+        except Exception as e:
+            print(f"[RAG] فشلت إعادة بناء الفهرس {self.name}: {e}")
+        finally:
+            self._build_lock.release()
+
+    def refresh(self) -> Dict:
+        """فحص فوري للملفات وتطبيق التغييرات (ينتظر إعادة البناء إن لزمت)؛ يعيد ملخص الحالة"""
+        with self._lock:
+            self._checked = time.monotonic()
+            fingerprint = self.fingerprint()
+            done = self._apply(fingerprint)
+        if not done:
+            with self._build_lock:
+                self._rebuild(fingerprint)
+        with self._lock:
+            return self.stats()
+
+    def stats(self) -> Dict:
+        snap, delta = self._snap or {}, self._delta or {}
+        return {"files": len(snap.get("files", ())), "chunks": len(snap.get("chunks", ())),
+                "delta_files": len(delta.get("files", ())), "delta_chunks": len(delta.get("chunks", ())),
+                "masked": delta.get("n_masked", 0), "built_at": snap.get("built_at"), "dedup": snap.get("dedup")}
+
+    # ---------- الاستعلام ----------
+    def query(self, query: str, top_k: int = 4, snippets: bool = False) -> List[Dict]:
+        """أفضل المقاطع: [{source, start, end, text, score}] (+ snippet: أفضل سطر، إن كان passages=True)"""
+        snap, delta = self.ensure()
+        toks = tokenize_ar(query or "")
+        hits = []
+        masked = delta["masked"]
+        # نطلب زيادة بعدد المقاطع المحجوبة: يضمن بقاء top_k حيّة بعد التصفية
+        for i, score in snap["bm25"].top_k(toks, top_k + delta["n_masked"]):
+            if masked is None or not masked[i]:
+                hits.append((score, snap, i))
+        if delta["bm25"] is not None:
+            hits.extend((score, delta, i) for i, score in delta["bm25"].top_k(toks, top_k))
+        hits.sort(key=lambda h: -h[0])
+        out = []
+        for score, seg, i in hits[:top_k]:
+            fi, s, e = (int(x) for x in seg["chunks"][i])
+            out.append({"source": seg["files"][fi], "start": s, "end": e,
+                        "text": seg["texts"][i], "score": float(score)})
+            if snippets and "pass_ptr" in seg:
+                out[-1]["snippet"] = best_passage(seg, i, toks)
+            al = seg["aliases"]
+            a, b = int(np.searchsorted(al[:, 0], i, "left")), int(np.searchsorted(al[:, 0], i, "right"))
+            if b > a:
+                out[-1]["aliases"] = [{"source": seg["files"][int(r[1])], "start": int(r[2]), "end": int(r[3])}
+                                      for r in al[a:b]]
+        return out
+
+    def __len__(self) -> int:
+        snap, delta = self.ensure()
+        return len(snap["chunks"]) - delta["n_masked"] + len(delta["chunks"])
@@ -0,0 +1,83 @@
+# src/rag/dedup.py — إزالة المقاطع شبه المكررة وقت الفهرسة (MinHash + LSH)
+# - بصمة المقطع: MinHash بـ 64 دالة على ثلاثيات الكلمات (shingles)؛ كل ثلاثية بصمة 64 بت
+#   (splitmix64) وكل دالة a*x+b بحساب uint64 يلتف فعلًا (multiply-shift) بمعاملات عشوائية 64 بت
+# - LSH: 8 نطاقات × 8 صفوف → المرشحون فقط تُقارن بصماتهم (تشابه Jaccard التقديري)
+# - المقطع الذي يشبه مقطعًا سابقًا بنسبة ≥ RAG_DEDUP_THRESHOLD لا يُفهرس؛ يُسجَّل كاسم بديل
+#   (alias) للمقطع الأول، فيظهر مصدره ضمن نتيجة ذلك المقطع
+import os, zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.rag.chunk_index import tokenize_ar
+
+DEDUP = os.getenv("RAG_DEDUP", "1").strip().lower() in {"1", "true", "yes", "on"}
+THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.85"))
+NUM_PERM, BANDS = 64, 8
+_ROWS = NUM_PERM // BANDS
+_rng = np.random.default_rng(20240611)  # ثابت: نفس النتائج في كل عامل وكل بناء
+_A = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # فردي
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + _rng.integers(0, 2, NUM_PERM, dtype=np.uint64)
+_K1, _K2 = np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64: كل بت في الناتج يعتمد على كل بتات المدخل (الحساب يلتف عند 2^64)"""
+    x = x + _K1
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _shingles(text: str) -> np.ndarray:
+    toks = tokenize_ar(text)
+    h = _mix64(np.fromiter((zlib.crc32(t.encode("utf-8")) for t in toks), dtype=np.uint64, count=len(toks)))
+    if len(h) >= 3:
+        h = _mix64(h[:-2] ^ _mix64(h[1:-1] ^ _mix64(h[2:] + _K2)))
+    return np.unique(h)
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    x = _shingles(text)
+    if not len(x):
+        return None
+    with np.errstate(over="ignore"):
+        # (a*x+b) mod 2^64 ثم البتات العليا: ترتيب مختلف فعلًا لكل دالة
+        return ((_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1)
+
+
+class Deduper:
+    """يُغذّى بالمقاطع بالترتيب؛ check() يعيد رقم المقطع الأصلي إن كان هذا شبه مكرر"""
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self._bands: List[Dict[bytes, List[int]]] = [{} for _ in range(BANDS)]
+        self._sigs: Dict[int, np.ndarray] = {}
+        self.seen = self.dups = self.dup_bytes = self.bytes = 0
+
+    def check(self, key: int, text: str) -> Optional[int]:
+        self.seen += 1
+        size = len(text.encode("utf-8"))
+        self.bytes += size
+        sig = signature(text)
+        if sig is None:
+            return None
+        parts = [sig[i * _ROWS:(i + 1) * _ROWS].tobytes() for i in range(BANDS)]
+        cands = set()
+        for band, part in zip(self._bands, parts):
+            cands.update(band.get(part, ()))
+        for c in sorted(cands):
+            if float(np.mean(self._sigs[c] == sig)) >= self.threshold:
+                self.dups += 1
+                self.dup_bytes += size
+                return c
+        self._sigs[key] = sig
+        for band, part in zip(self._bands, parts):
+            band.setdefault(part, []).append(key)
+        return None
+
+    def report(self) -> Dict:
+        return {"chunks_seen": self.seen, "dup_chunks": self.dups, "dup_bytes": self.dup_bytes,
+                "dup_ratio": round(self.dups / self.seen, 4) if self.seen else 0.0,
+                "bytes_saved_ratio": round(self.dup_bytes / self.bytes, 4) if self.bytes else 0.0}
+
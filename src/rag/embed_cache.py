@@ -0,0 +1,118 @@
+# src/rag/embed_cache.py — كاش متجهات التضمين حسب محتوى المقطع
+#   - مخزن دائم (SQLite في RAG_DENSE_DIR): المفتاح = (النموذج، sha1 لنص المقطع) → متجه float32
+#     أي مقطع لم يتغير نصّه لا يُرمَّز مرة أخرى، حتى لو تغيّر ملفه أو أُعيد بناء الفهرس كاملًا
+#   - أسئلة المستخدم: LRU محدود في الذاكرة (RAG_QUERY_EMB_ITEMS) لأن الأسئلة تتكرر كثيرًا
+import os, hashlib, sqlite3, threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+EMB_DB = os.getenv("RAG_EMB_DB", os.path.join(os.getenv("RAG_DENSE_DIR", os.path.join("cache", "rag_dense")), "embeddings.sqlite"))
+QUERY_ITEMS = int(os.getenv("RAG_QUERY_EMB_ITEMS", "1024"))
+
+Encoder = Callable[[str, List[str]], np.ndarray]
+
+_LOCK = threading.Lock()
+_conn = None
+_queries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+_stats = {"chunk_hits": 0, "chunk_encoded": 0, "query_hits": 0, "query_encoded": 0}
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest()
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(EMB_DB) or ".", exist_ok=True)
+        _conn = sqlite3.connect(EMB_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb ("
+            " model TEXT NOT NULL, h TEXT NOT NULL, dim INTEGER NOT NULL, v BLOB NOT NULL,"
+            " PRIMARY KEY (model, h)) WITHOUT ROWID"
+        )
+    return _conn
+
+
+def lookup(model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+    """المتجهات المحفوظة فقط (بلا ترميز): {مفتاح: متجه}"""
+    with _LOCK:
+        return _lookup(model, keys)
+
+
+def _lookup(model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+    out: Dict[str, np.ndarray] = {}
+    uniq = list(dict.fromkeys(keys))
+    for i in range(0, len(uniq), 500):  # حد متغيرات SQLite
+        part = uniq[i:i + 500]
+        rows = _db().execute(
+            f"SELECT h, v FROM emb WHERE model=? AND h IN ({','.join('?' * len(part))})", [model, *part]
+        ).fetchall()
+        for h, v in rows:
+            out[h] = np.frombuffer(v, dtype=np.float32)
+    return out
+
+
+def encode_chunks(model: str, texts: List[str], encode: Encoder) -> np.ndarray:
+    """متجهات المقاطع بنفس الترتيب؛ يُرمَّز فقط ما ليس في المخزن ثم يُحفظ"""
+    keys = [content_key(t) for t in texts]
+    with _LOCK:
+        known = _lookup(model, keys)
+    todo = [h for h in dict.fromkeys(keys) if h not in known]
+    if todo:
+        first = {}
+        for h, t in zip(keys, texts):
+            first.setdefault(h, t)
+        X = encode(model, [first[h] for h in todo])
+        with _LOCK:
+            with _db() as c:
+                c.executemany(
+                    "INSERT OR REPLACE INTO emb (model, h, dim, v) VALUES (?, ?, ?, ?)",
+                    [(model, h, int(x.shape[0]), np.asarray(x, dtype=np.float32).tobytes()) for h, x in zip(todo, X)],
+                )
+            known.update(zip(todo, (np.asarray(x, dtype=np.float32) for x in X)))
+    with _LOCK:
+        _stats["chunk_hits"] += len(keys) - len(todo)
+        _stats["chunk_encoded"] += len(todo)
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.stack([known[h] for h in keys]), dtype=np.float32)
+
+
+def encode_query(model: str, query: str, encode: Encoder) -> np.ndarray:
+    """متجه السؤال بشكل (1, dim) من LRU، أو ترميز جديد"""
+    k = (model, query)
+    with _LOCK:
+        v = _queries.get(k)
+        if v is not None:
+            _queries.move_to_end(k)
+            _stats["query_hits"] += 1
+            return v
+    v = np.ascontiguousarray(encode(model, [query]), dtype=np.float32)
+    with _LOCK:
+        _queries[k] = v
+        _stats["query_encoded"] += 1
+        while len(_queries) > QUERY_ITEMS:
+            _queries.popitem(last=False)
+    return v
+
+
+def prune(model: str, keep: List[str]) -> int:
+    """يحذف متجهات النموذج التي لم تعد مستخدمة (keep = مفاتيح المقاطع الحالية)"""
+    with _LOCK:
+        c = _db()
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS keep_h (h TEXT PRIMARY KEY)")
+        c.execute("DELETE FROM keep_h")
+        c.executemany("INSERT OR IGNORE INTO keep_h VALUES (?)", [(h,) for h in keep])
+        n = c.execute("DELETE FROM emb WHERE model=? AND h NOT IN (SELECT h FROM keep_h)", (model,)).rowcount
+        c.commit()
+        return n
+
+
+def stats() -> Dict[str, int]:
+    with _LOCK:
+        return {**_stats, "query_lru": len(_queries), "query_lru_max": QUERY_ITEMS}
@@ -0,0 +1,190 @@
+# src/rag/fts_store.py — مخزن مقاطع على القرص عبر SQLite FTS5 (بديل للفهرس داخل الذاكرة)
+# - ملف لكل مدونة: cache/rag_fts_<name>.sqlite (RAG_FTS_DIR)؛ الذاكرة لا تكبر مع حجم المدونة
+#   والعمال المتعددون (uvicorn --workers) يقرؤون نفس الملف بأمان (WAL)
+# - chunks: النص الأصلي وإزاحاته، و fts: نص مُنمَّط للعربية (بلا تشكيل/تطويل، توحيد الألف
+#   والياء والتاء المربوطة) بنفس rowid؛ السؤال يُنمَّط بنفس الطريقة والترتيب بـ bm25()
+# - التحديث لكل ملف على حدة: استخراج مقاطعه (PDF ...) خارج أي قفل، ثم معاملة كتابة قصيرة لكل
+#   ملف (حذف القديم + إدراج الجديد)؛ إن سبق عامل آخر إلى ملف يجده الآخرون متطابقًا فيتجاوزونه
+# - الاستعلام لا ينتظر كاتبًا: إن كانت القاعدة مقفلة (أو خيط آخر يحدّث) يخدم اللقطة الحالية
+# نفس واجهة ChunkIndex: query / refresh / stats / len — يُختار عبر RAG_BACKEND=fts
+import os, re, sqlite3, threading, time
+from typing import Dict, List, Sequence
+
+from src.rag.chunk_index import ChunkIndex, REFRESH_SECS, TEXT_PATTERNS, forget_file, iter_file_chunks, tokenize_ar
+
+FTS_DIR = os.getenv("RAG_FTS_DIR", "cache")
+BUSY_MS = 30_000  # انتظار الكاتب الآخر في refresh
+
+_TASHKEEL = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_AR_MAP = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي"})
+
+
+def normalize_ar(s: str) -> str:
+    return _TASHKEEL.sub("", s or "").translate(_AR_MAP).lower()
+
+
+def _match_expr(query: str) -> str:
+    toks = dict.fromkeys(tokenize_ar(normalize_ar(query)))
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in toks)
+
+
+class FtsIndex(ChunkIndex):
+    def __init__(self, name: str, roots: Sequence[str], patterns: Sequence[str] = TEXT_PATTERNS,
+                 passages: bool = False):
+        super().__init__(name, roots, patterns, passages=passages)
+        self.path = os.path.join(FTS_DIR, f"rag_fts_{name}.sqlite")
+        self._local = threading.local()
+        self._last: Dict = {"delta_files": 0, "delta_chunks": 0, "masked": 0}
+
+    # ---------- الاتصال (واحد لكل خيط) ----------
+    def _db(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=BUSY_MS / 1000, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER);"
+                "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, path TEXT NOT NULL,"
+                " start INTEGER, end INTEGER, text TEXT);"
+                "CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(body, tokenize='unicode61 remove_diacritics 2');"
+            )
+            self._local.con = con
+        return con
+
+    # ---------- التحديث ----------
+    def _begin(self, con: sqlite3.Connection, blocking: bool) -> bool:
+        """BEGIN IMMEDIATE (كاتب واحد بين كل العمال)؛ بلا انتظار: False إن كان عامل آخر يكتب"""
+        if blocking:
+            con.execute("BEGIN IMMEDIATE")
+            return True
+        con.execute("PRAGMA busy_timeout=0")
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            return True
+        except sqlite3.OperationalError:  # database is locked
+            return False
+        finally:
+            con.execute(f"PRAGMA busy_timeout={BUSY_MS}")
+
+    def _busy(self, con: sqlite3.Connection) -> bool:
+        """عامل آخر يمسك قفل الكتابة الآن؟ (فحص بلا انتظار)"""
+        if not self._begin(con, blocking=False):
+            return True
+        con.execute("ROLLBACK")
+        return False
+
+    def _apply(self, fingerprint, blocking: bool = True) -> bool:
+        """يحدّث الملفات المتغيرة واحدًا واحدًا؛ True إن طابقت القاعدة البصمة كلها"""
+        now = {f: (m, s) for f, m, s in fingerprint}
+        con = self._db()
+        known = {p: (m, s) for p, m, s in con.execute("SELECT path, mtime_ns, size FROM files")}
+        todo = [f for f in known if f not in now] + [f for f in now if known.get(f) != now[f]]
+        masked = added = done = 0
+        for f in todo:
+            if not blocking and self._busy(con):
+                break  # لا نستخرج ملفًا لن نستطيع كتابته الآن
+            # الاستخراج قبل قفل الكتابة: القفل يُمسك لزمن الحذف والإدراج فقط
+            chunks = list(iter_file_chunks(f)) if f in now else []
+            if not self._begin(con, blocking):
+                break
+            try:
+                row = con.execute("SELECT mtime_ns, size FROM files WHERE path=?", (f,)).fetchone()
+                if (tuple(row) if row else None) != now.get(f):  # لم يسبقنا إليه عامل آخر
+                    ids = [r[0] for r in con.execute("SELECT id FROM chunks WHERE path=?", (f,))]
+                    con.executemany("DELETE FROM fts WHERE rowid=?", [(i,) for i in ids])
+                    con.execute("DELETE FROM chunks WHERE path=?", (f,))
+                    con.execute("DELETE FROM files WHERE path=?", (f,))
+                    masked += len(ids)
+                    if f in now:
+                        for s, e, t in chunks:
+                            cur = con.execute("INSERT INTO chunks (path, start, end, text) VALUES (?, ?, ?, ?)",
+                                              (f, s, e, t))
+                            con.execute("INSERT INTO fts (rowid, body) VALUES (?, ?)", (cur.lastrowid, normalize_ar(t)))
+                            added += 1
+                        con.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)", (f, *now[f]))
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            if f not in now:
+                forget_file(f)
+            done += 1
+        if done:
+            self._last = {"delta_files": done, "delta_chunks": added, "masked": masked}
+        if done < len(todo):
+            return False  # القفل مشغول: يُكمل الفحص التالي ما بقي
+        self._fingerprint = fingerprint
+        return True
+
+    def ensure(self) -> None:
+        # القارئ لا ينتظر: إن كان خيط آخر هنا أو عامل آخر يكتب، يخدم ما في القاعدة الآن
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            # حتى قبل أول تحديث ناجح: محاولة واحدة كل REFRESH_SECS لا مع كل استعلام
+            if not self._checked or now - self._checked >= REFRESH_SECS:
+                self._checked = now
+                fingerprint = self.fingerprint()
+                if fingerprint != self._fingerprint:
+                    self._apply(fingerprint, blocking=False)
+        finally:
+            self._lock.release()
+
+    def refresh(self) -> Dict:
+        with self._lock:
+            self._checked = time.monotonic()
+            fingerprint = self.fingerprint()
+            self._last = {"delta_files": 0, "delta_chunks": 0, "masked": 0}
+            if fingerprint != self._fingerprint:
+                self._apply(fingerprint)
+            return self.stats()
+
+    def stats(self) -> Dict:
+        con = self._db()
+        files = con.execute("SELECT count(*) FROM files").fetchone()[0]
+        chunks = con.execute("SELECT count(*) FROM chunks").fetchone()[0]
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {"backend": "fts", "files": files, "chunks": chunks, "db_bytes": size, **self._last}
+
+    # ---------- الاستعلام ----------
+    def query(self, query: str, top_k: int = 4, snippets: bool = False) -> List[Dict]:
+        """أفضل المقاطع: [{source, start, end, text, score}] (+ snippet)"""
+        self.ensure()
+        expr = _match_expr(query)
+        if not expr:
+            return []
+        rows = self._db().execute(
+            "SELECT c.path, c.start, c.end, c.text, bm25(fts) AS r FROM fts JOIN chunks c ON c.id = fts.rowid"
+            " WHERE fts MATCH ? ORDER BY r LIMIT ?", (expr, top_k)
+        ).fetchall()
+        out = []
+        for path, s, e, text, r in rows:
+            out.append({"source": path, "start": s, "end": e, "text": text, "score": -float(r)})
+            if snippets:
+                out[-1]["snippet"] = _best_line(text, query)
+        return out
+
+    def __len__(self) -> int:
+        self.ensure()
+        return self._db().execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+
+def _best_line(text: str, query: str, max_chars: int = 400) -> str:
+    q = set(tokenize_ar(normalize_ar(query)))
+    best, best_score = "", -1.0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        toks = tokenize_ar(normalize_ar(line))
+        score = sum(1 for t in set(toks) if t in q) / (1.0 + 0.05 * len(toks))
+        if score > best_score:
+            best, best_score = line, score
+    return best or text[:max_chars]
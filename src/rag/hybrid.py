@@ -0,0 +1,71 @@
+# src/rag/hybrid.py — استرجاع هجين: BM25 يختار المرشحين، والتضمين يعيد ترتيبهم فقط
+#   1) أفضل RAG_HYBRID_CANDIDATES مقطعًا من فهرس BM25 (service/retriever)
+#   2) متجهاتها من كاش التضمين (embed_cache) حسب محتوى المقطع — لا بحث دلالي على كل المدونة
+#      ولا ترميز للمقاطع وقت الاستعلام؛ المقطع بلا متجه محفوظ يبقى بترتيب BM25 وحده
+#   3) دمج الترتيبين بـ Reciprocal Rank Fusion
+# الكلفة تتبع عدد المرشحين لا حجم المدونة. قارن عبر bench_hybrid.py
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.rag import embed_cache
+from src.rag.service import get_index
+
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "200"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+DENSE_WEIGHT = float(os.getenv("RAG_HYBRID_DENSE_WEIGHT", "1.0"))
+
+
+def fuse(n: int, dense: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    """
+    n مرشحًا بترتيب BM25 (0 = الأفضل)، و dense درجات التشابه (nan = بلا متجه).
+    يعيد [(موضع المرشح، درجة الدمج)] لأفضل top_k.
+    """
+    fused = 1.0 / (RRF_K + 1 + np.arange(n, dtype=np.float64))
+    have = np.flatnonzero(~np.isnan(dense))
+    if len(have):
+        order = have[np.argsort(-dense[have], kind="stable")]
+        fused[order] += DENSE_WEIGHT / (RRF_K + 1 + np.arange(len(order), dtype=np.float64))
+    top = np.argsort(-fused, kind="stable")[:top_k]
+    return [(int(i), float(fused[i])) for i in top]
+
+
+def dense_scores(qvec: np.ndarray, vecs: Sequence[Optional[np.ndarray]]) -> np.ndarray:
+    out = np.full(len(vecs), np.nan, dtype=np.float32)
+    rows = [i for i, v in enumerate(vecs) if v is not None]
+    if rows:
+        out[rows] = np.stack([vecs[i] for i in rows]) @ qvec.reshape(-1)
+    return out
+
+
+def _model_name() -> str:
+    from src.rag import indexer
+    man = indexer._read_json(indexer._MANIFEST, None) or {}
+    return man.get("model", indexer.MODEL_NAME)
+
+
+def rerank(query: str, hits: List[Dict], top_k: int, model: Optional[str] = None) -> List[Dict]:
+    """يعيد ترتيب مرشحي BM25 (مخرجات ChunkIndex.query) بالتضمين المحفوظ"""
+    if not hits:
+        return []
+    from src.rag import indexer
+    model = model or _model_name()
+    keys = [embed_cache.content_key(h["text"]) for h in hits]
+    known = embed_cache.lookup(model, keys)
+    if not known:
+        return hits[:top_k]
+    qvec = embed_cache.encode_query(model, query or "", indexer._encode)
+    dense = dense_scores(qvec, [known.get(k) for k in keys])
+    out = []
+    for i, score in fuse(len(hits), dense, top_k):
+        h = dict(hits[i])
+        h["bm25"], h["dense"], h["score"] = h["score"], (None if np.isnan(dense[i]) else float(dense[i])), score
+        out.append(h)
+    return out
+
+
+def query_hybrid(query: str, top_k: int = 4, candidates: int = HYBRID_CANDIDATES, index: str = "docs") -> List[Dict]:
+    """[{source, start, end, text, score, bm25, dense}] — نفس شكل ChunkIndex.query مع الدرجتين"""
+    hits = get_index(index).query(query, top_k=max(top_k, candidates))
+    return rerank(query, hits, top_k)
@@ -1,66 +1,301 @@
 # src/rag/indexer.py — يبني فهرس من ملفات docs/ (اختياري)
+#
+# التخزين في RAG_DENSE_DIR (افتراضيًا cache/rag_dense):
+#   index.faiss   فهرس FAISS كملف عادي يُقرأ بـ mmap → العمال يتشاركون الصفحات عبر ذاكرة النظام
+#   manifest.json صغير جدًا (الإصدار، النموذج، النوع، العدد) → is_ready() فحص O(1)
+#   files.json    حالة كل ملف (mtime/size ونطاق أرقام مقاطعه) → التحديث التزايدي
+#   chunks.jsonl  نصوص المقاطع؛ السطر رقم i = المقطع i (إلحاق فقط؛ يُعاد كتابته عند البناء الكامل)
+#                 يُقرأ عبر mmap مع جدول بدايات الأسطر (text_store.LineStore) بدل تحميله في قاموس
+#
+# الأنواع (RAG_DENSE_KIND): flat | ivf | hnsw | auto (flat حتى 100k مقطع ثم ivf)
+# التخزين (RAG_DENSE_CODEC): f32 | sq8 (int8، ربع الحجم) | pq (RAG_PQ_M بايت لكل متجه)
+#   pq يحتاج ~10k مقطع للتدريب (وإلا sq8)، و hnsw يدعم f32/sq8 فقط. قارن عبر bench_dense.py
+# build_index() تزايدي: يرمّز فقط الملفات الجديدة/المتغيرة ويحذف مقاطع المحذوفة.
+# المتجهات نفسها محفوظة حسب محتوى المقطع (embed_cache.py): حتى البناء الكامل لا يرمّز
+# إلا المقاطع التي تغيّر نصها.
+import os, glob, json, math, time, threading
+import importlib.util
+from typing import Dict, List, Optional, Tuple
 
-import os, glob
-from diskcache import Cache
+import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 
-cache = Cache(".cache")
+from src.rag import embed_cache
+from src.rag.chunk_index import chunk_spans, iter_file_chunks
+from src.rag.dedup import DEDUP, Deduper
+from src.rag.text_store import LineStore
+
+MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DENSE_DIR = os.getenv("RAG_DENSE_DIR", os.path.join("cache", "rag_dense"))
+DENSE_KIND = os.getenv("RAG_DENSE_KIND", "auto")
+AUTO_ANN_MIN = int(os.getenv("RAG_DENSE_ANN_MIN", "100000"))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF", "64"))
+DENSE_CODEC = os.getenv("RAG_DENSE_CODEC", "f32")
+PQ_M = int(os.getenv("RAG_PQ_M", "48"))
+PQ_MIN_TRAIN = 256 * 39  # faiss: ~39 نقطة لكل مركز من 256
+MANIFEST_VERSION = 2
+
+_INDEX_FILE, _MANIFEST, _FILES, _CHUNKS = "index.faiss", "manifest.json", "files.json", "chunks.jsonl"
 
 def chunk_text(txt, n=700, overlap=80):
-    out=[]; i=0
-    while i < len(txt):
-        out.append(txt[i:i+n])
-        i += n - overlap
-    return out
+    return [txt[s:e] for s, e in chunk_spans(txt, n, overlap)]
 
-def is_ready() -> bool:
-    return all(cache.get(k) is not None for k in ["rag:index","rag:chunks","rag:metas"])
 
-def build_index(docs_dir="docs", model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
-    files = []
-    for ext in ("*.txt","*.md"):
-        files += glob.glob(os.path.join(docs_dir, ext))
+# -------------------- ملفات الحالة --------------------
+def _p(name: str) -> str:
+    return os.path.join(DENSE_DIR, name)
+
+def _read_json(name: str, default):
     try:
-        import fitz  # PyMuPDF
-        files += glob.glob(os.path.join(docs_dir, "*.pdf"))
+        with open(_p(name), "r", encoding="utf-8") as f:
+            return json.load(f)
     except Exception:
-        pass
+        return default
 
-    if not files:
-        return "لا توجد ملفات داخل docs/"
+def _write_json(name: str, obj) -> None:
+    tmp = _p(name) + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, _p(name))
+
+def is_ready() -> bool:
+    m = _read_json(_MANIFEST, None)
+    return bool(m and m.get("version") == MANIFEST_VERSION and m.get("count", 0) > 0)
+
+
+# -------------------- الترميز --------------------
+_MODELS: Dict[str, object] = {}
+_MODELS_LOCK = threading.Lock()
 
-    model = SentenceTransformer(model_name)
-    chunks, metas = [], []
+def _model(model_name: str):
+    with _MODELS_LOCK:
+        m = _MODELS.get(model_name)
+        if m is None:
+            from sentence_transformers import SentenceTransformer
+            m = _MODELS[model_name] = SentenceTransformer(model_name)
+        return m
 
-    for path in files:
-        text=""
-        if path.lower().endswith(".pdf"):
+def _encode(model_name: str, texts: List[str]) -> np.ndarray:
+    X = _model(model_name).encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+# -------------------- إنشاء الفهرس --------------------
+def _codec(codec: str, kind: str, n: int, dim: int) -> Tuple[str, str]:
+    """(اسم الترميز الفعلي، جزء index_factory)"""
+    if codec == "pq" and (kind == "hnsw" or n < PQ_MIN_TRAIN or dim % PQ_M):
+        codec = "sq8"
+    if codec == "pq":
+        return "pq", f"PQ{PQ_M}"
+    if codec == "sq8":
+        return "sq8", "SQ8"
+    return "f32", "Flat"
+
+def index_spec(kind: str, codec: str, n: int, dim: int) -> Tuple[str, str, str]:
+    """(النوع، الترميز، نص index_factory) لعدد n من المتجهات"""
+    if kind == "auto":
+        kind = "ivf" if n >= AUTO_ANN_MIN else "flat"
+    codec, part = _codec(codec, kind, n, dim)
+    if kind == "hnsw":
+        return "hnsw", codec, f"IDMap2,HNSW{HNSW_M}" + ("" if part == "Flat" else "," + part)
+    if kind == "ivf":
+        # ~39 نقطة تدريب لكل خلية على الأقل حتى يكون k-means مستقرًا
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+        return "ivf", codec, f"IVF{nlist},{part}"
+    return "flat", codec, f"IDMap2,{part}"
+
+def _new_index(kind: str, codec: str, X: np.ndarray) -> Tuple[faiss.Index, str, str]:
+    kind, codec, spec = index_spec(kind, codec, *X.shape)
+    index = faiss.index_factory(X.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(X)
+    return index, kind, codec
+
+def _tune(index: faiss.Index, kind: str) -> None:
+    """إعدادات البحث (لا تُحفظ داخل الملف بشكل موثوق لكل الأنواع)"""
+    ps = faiss.ParameterSpace()
+    for name, value, k in (("nprobe", IVF_NPROBE, "ivf"), ("efSearch", HNSW_EF_SEARCH, "hnsw")):
+        if kind == k:
             try:
-                import fitz
-                with fitz.open(path) as doc:
-                    for page in doc:
-                        text += page.get_text()
+                ps.set_index_parameter(index, name, value)
             except Exception:
-                continue
-        else:
+                pass
+
+def _write_index(index: faiss.Index) -> None:
+    tmp = _p(_INDEX_FILE) + f".{os.getpid()}.tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, _p(_INDEX_FILE))  # من فتح النسخة القديمة بـ mmap يبقى عليها حتى يعيد التحميل
+
+def _clear() -> None:
+    """لا ملفات ولا نصوص: يُحذف الفهرس السابق (manifest أولًا → القراء يرونه غير جاهز فورًا)"""
+    for name in (_MANIFEST, _INDEX_FILE, _FILES, _CHUNKS):
+        try:
+            os.remove(_p(name))  # من فتحها بـ mmap يبقى عليها حتى يعيد التحميل
+        except OSError:
+            pass
+
+
+# -------------------- البناء / التحديث التزايدي --------------------
+def _list_files(docs_dir: str) -> Dict[str, List[int]]:
+    pats = ["*.txt", "*.md"]
+    if importlib.util.find_spec("fitz") is not None:  # PyMuPDF
+        pats.append("*.pdf")
+    out = {}
+    for ext in pats:
+        for fp in glob.glob(os.path.join(docs_dir, "**", ext), recursive=True):
             try:
-                text = open(path, "r", encoding="utf-8", errors="ignore").read()
-            except Exception:
-                continue
+                st = os.stat(fp)
+                out[fp] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                pass
+    return out
+
+def build_index(docs_dir="docs", model_name=MODEL_NAME, kind: Optional[str] = None, rebuild: bool = False,
+                codec: Optional[str] = None):
+    """
+    يبني الفهرس أول مرة، وبعدها يضيف الملفات الجديدة ويحذف/يعيد ترميز المتغيرة فقط.
+    rebuild=True أو تغيير النموذج/النوع/الترميز → بناء كامل (المتجهات من embed_cache).
+    """
+    files_now = _list_files(docs_dir)
+    if not files_now:
+        _clear()
+        return "لا توجد ملفات داخل docs/"
+    os.makedirs(DENSE_DIR, exist_ok=True)
+
+    # المطلوب فعليًا (المعامل، وإلا RAG_DENSE_KIND / RAG_DENSE_CODEC) يُقارن بما بُني به الفهرس
+    requested, req_codec = kind or DENSE_KIND, codec or DENSE_CODEC
+    man = _read_json(_MANIFEST, None) if is_ready() else None
+    state: Dict[str, Dict] = _read_json(_FILES, {}) if man else {}
+    full = (rebuild or man is None or man.get("model") != model_name
+            or requested != man.get("requested")
+            or req_codec != man.get("requested_codec", "f32"))
 
-        for ch in chunk_text(text):
-            chunks.append(ch)
-            metas.append({"source": os.path.basename(path)})
+    stale = [p for p, st in state.items() if files_now.get(p) != st["sig"]]
+    # ملفات مقاطعها المكررة تشير إلى مقاطع ملف سيُحذف تفقد من يمثلها → تُعاد فهرستها أيضًا
+    while stale:
+        gone = [state[p]["ids"] for p in stale]
+        extra = [p for p, st in state.items() if p not in stale
+                 and any(a <= c < b for c in st.get("dup_of", ()) for a, b in gone)]
+        if not extra:
+            break
+        stale += extra
+    if not full and stale and man.get("kind") == "hnsw":
+        full = True  # HNSW لا يدعم الحذف
 
-    if not chunks:
+    if not full and len(LineStore(_p(_CHUNKS))) != man["next_id"]:
+        full = True  # انقطاع سابق بين إلحاق المقاطع وكتابة manifest
+
+    index = None
+    if not full:
+        try:
+            index = faiss.read_index(_p(_INDEX_FILE))
+        except Exception:
+            full = True
+    if full:
+        state, stale, next_id, built_kind, built_codec = {}, [], 0, None, None
+    else:
+        next_id, built_kind, built_codec = man["next_id"], man["kind"], man.get("codec", "f32")
+
+    removed = 0
+    for p in stale:
+        a, b = state.pop(p)["ids"]
+        if b > a:
+            index.remove_ids(np.arange(a, b, dtype=np.int64))
+            removed += b - a
+
+    added_files = [p for p in sorted(files_now) if p not in state]
+    texts: List[str] = []
+    rows: List[Dict] = []
+    dd = Deduper() if DEDUP else None  # شبه المكرر داخل هذه الدفعة → اسم بديل للمقطع الأول
+    for p in added_files:
+        first, dup_of = next_id + len(texts), []
+        for s, e, t in iter_file_chunks(p):
+            cid = next_id + len(texts)
+            canon = dd.check(cid, t) if dd else None
+            if canon is None:
+                rows.append({"id": cid, "source": os.path.basename(p), "path": p, "start": s, "end": e})
+                texts.append(t)
+            else:
+                rows[canon - next_id].setdefault("aliases", []).append(
+                    {"source": os.path.basename(p), "path": p, "start": s, "end": e})
+                dup_of.append(canon)
+        state[p] = {"sig": files_now[p], "ids": [first, next_id + len(texts)], "dup_of": dup_of}
+
+    if index is None and not texts:
+        _clear()
         return "لم يتم استخراج نصوص صالحة."
 
-    X = model.encode(chunks, convert_to_numpy=True, normalize_embeddings=True)
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
+    if texts:
+        X = embed_cache.encode_chunks(model_name, texts, _encode)
+        if index is None:
+            index, built_kind, built_codec = _new_index(requested, req_codec, X)
+        index.add_with_ids(X, np.arange(next_id, next_id + len(texts), dtype=np.int64))
+        # البناء الكامل يكتب ملفًا جديدًا ثم os.replace: لا نقطع أبدًا ملفًا قد يكون مفتوحًا بـ mmap
+        # (LineStore في هذا العامل أو غيره ← SIGBUS)؛ الإضافة في آخره آمنة
+        chunks_path = f"{_p(_CHUNKS)}.{os.getpid()}.tmp" if full else _p(_CHUNKS)
+        with open(chunks_path, "w" if full else "a", encoding="utf-8") as f:
+            for r, t in zip(rows, texts):
+                f.write(json.dumps({**r, "text": t}, ensure_ascii=False) + "\n")
+        next_id += len(texts)
+
+    if full:
+        embed_cache.prune(model_name, [embed_cache.content_key(t) for t in texts])
 
-    cache.set("rag:index", index)
-    cache.set("rag:chunks", chunks)
-    cache.set("rag:metas", metas)
-    return f"تم بناء فهرس RAG لعدد {len(chunks)} مقطع من {len(files)} ملف."
+    _write_index(index)
+    if full:
+        os.replace(f"{_p(_CHUNKS)}.{os.getpid()}.tmp", _p(_CHUNKS))
+    _write_json(_FILES, state)
+    _write_json(_MANIFEST, {
+        "version": MANIFEST_VERSION, "model": model_name, "kind": built_kind, "requested": requested,
+        "codec": built_codec, "requested_codec": req_codec,
+        "dim": index.d, "count": int(index.ntotal), "next_id": next_id, "built_at": time.time(),
+    })
+    dups = f" (تخطّي {dd.dups} مقطع مكرر، {dd.dup_bytes / 1e6:.2f} MB)" if dd and dd.dups else ""
+    if full:
+        return f"تم بناء فهرس RAG لعدد {index.ntotal} مقطع من {len(files_now)} ملف.{dups}"
+    return f"تم تحديث فهرس RAG: +{len(texts)} مقطع جديد، -{removed} محذوف، الإجمالي {index.ntotal}.{dups}"
+
+
+# -------------------- الاستعلام --------------------
+_LOADED: Dict[str, object] = {}
+_LOAD_LOCK = threading.Lock()
+
+def _mmap_flags() -> int:
+    flags = faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP
+    return flags | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+def _current():
+    """الفهرس المحمّل (mmap) + نصوص المقاطع؛ يعاد التحميل إذا تغيّر manifest من عامل آخر"""
+    try:
+        mtime = os.stat(_p(_MANIFEST)).st_mtime_ns
+    except OSError:
+        return None
+    with _LOAD_LOCK:
+        if _LOADED.get("mtime") != mtime:
+            man = _read_json(_MANIFEST, {})
+            try:
+                index = faiss.read_index(_p(_INDEX_FILE), _mmap_flags())
+            except Exception:
+                index = faiss.read_index(_p(_INDEX_FILE))  # نسخ faiss قديمة بلا mmap لهذا النوع
+            _tune(index, man.get("kind", "flat"))
+            _LOADED.update(mtime=mtime, man=man, index=index, chunks=LineStore(_p(_CHUNKS)))
+        return _LOADED
+
+def query_dense(query: str, top_k: int = 4) -> List[Dict]:
+    """أقرب المقاطع دلاليًا: [{source, text, score, id}]"""
+    cur = _current()
+    if not cur or not cur["index"].ntotal:
+        return []
+    q = embed_cache.encode_query(cur["man"]["model"], query or "", _encode)
+    D, I = cur["index"].search(q, top_k)
+    out = []
+    for score, cid in zip(D[0], I[0]):
+        r = cur["chunks"].get(int(cid))
+        if cid < 0 or r is None:
+            continue
+        out.append({"id": int(cid), "source": r["source"], "text": r["text"], "score": float(score)})
+        if r.get("aliases"):
+            out[-1]["aliases"] = r["aliases"]
+    return out
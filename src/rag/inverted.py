@@ -0,0 +1,162 @@
+# src/rag/inverted.py — فهرس مقلوب مضغوط في مصفوفات NumPy مع استرجاع أفضل k بتقليم MaxScore
+#
+# التخزين (بدل قوائم/قواميس بايثون لكل مقطع):
+#   vocab     : dict كلمة → رقمها (الشيء الوحيد بحجم المفردات)
+#   offsets   : int64[n_terms+1]  بداية قائمة كل كلمة داخل المصفوفتين التاليتين
+#   doc_ids   : int32[n_postings] أرقام المقاطع (مرتبة تصاعديًا داخل كل قائمة)
+#   tfs       : uint16[n_postings] تكرار الكلمة في المقطع
+#   dl        : float32[n_docs]    طول كل مقطع
+#   idf, ub   : float32[n_terms]   idf وأعلى مساهمة ممكنة للكلمة (الحد الأعلى لـ MaxScore)
+#
+# MaxScore: نعالج كلمات السؤال من الأعلى حدًّا للأدنى. ما إن يصبح مجموع الحدود العليا
+# للكلمات المتبقية ≤ عتبة أفضل k الحالية، لا يمكن لمقطع جديد دخول القائمة؛ فنكتفي بتحديث
+# المرشحين الموجودين عبر searchsorted بدل المرور على القوائم الطويلة (الكلمات الشائعة).
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BM25_K1, BM25_B = 1.5, 0.75
+
+
+class InvertedIndex:
+    __slots__ = ("vocab", "offsets", "doc_ids", "tfs", "dl", "avgdl", "idf", "ub", "n_docs")
+
+    # ---------- البناء ----------
+    @classmethod
+    def build(cls, toks: Sequence[Sequence[str]], base: Optional["InvertedIndex"] = None) -> "InvertedIndex":
+        """
+        base: فهرس أساسي يُضاف إليه هذا الفهرس كـ"دلتا"؛ تُحسب idf و avgdl على المجموع
+        (أطوال الدلتا داخلة في المتوسط) فتبقى درجات المقطعين قابلة للمقارنة والدمج.
+        """
+        self = cls()
+        vocab: Dict[str, int] = {}
+        term_col: List[int] = []
+        doc_col: List[int] = []
+        tf_col: List[int] = []
+        dl = np.zeros(len(toks), dtype=np.float32)
+        for d, t in enumerate(toks):
+            dl[d] = len(t)
+            tf: Dict[int, int] = {}
+            for w in t:
+                tid = vocab.setdefault(w, len(vocab))
+                tf[tid] = tf.get(tid, 0) + 1
+            for tid, c in tf.items():
+                term_col.append(tid)
+                doc_col.append(d)
+                tf_col.append(min(c, 65535))
+
+        terms = np.asarray(term_col, dtype=np.int32)
+        # ترتيب مستقر حسب الكلمة: المقاطع تبقى تصاعدية داخل كل قائمة
+        order = np.argsort(terms, kind="stable")
+        self.vocab = vocab
+        self.doc_ids = np.asarray(doc_col, dtype=np.int32)[order]
+        self.tfs = np.asarray(tf_col, dtype=np.uint16)[order]
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.int64)
+        self.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.offsets[1:])
+        self.n_docs = len(toks)
+        self.dl = dl
+        self.avgdl = float(dl.mean()) if len(toks) else 1.0
+        n, df_all = self.n_docs, df
+        if base is not None and base.n_docs:
+            base_df = np.diff(base.offsets)
+            df_all = df + np.fromiter((base_df[base.vocab[w]] if w in base.vocab else 0 for w in vocab),
+                                  dtype=np.int64, count=len(vocab))
+            self.avgdl = float((base.avgdl * base.n_docs + dl.sum()) / (base.n_docs + len(toks)))
+            n += base.n_docs
+        self.idf = np.log1p((n - df_all + 0.5) / (df_all + 0.5)).astype(np.float32)
+        # الحد الأعلى لكل كلمة = أكبر مساهمة لها في أي مقطع (دفعة واحدة لكل القوائم)
+        self.ub = np.zeros(len(vocab), dtype=np.float32)
+        if len(self.doc_ids):
+            all_terms = np.repeat(np.arange(len(vocab), dtype=np.int32), df)
+            contrib = self.idf[all_terms] * self._tf_part(self.tfs, self.doc_ids)
+            self.ub = np.maximum.reduceat(contrib, self.offsets[:-1]).astype(np.float32)
+        return self
+
+    # ---------- الحفظ (مصفوفات تُقرأ عبر mmap، انظر text_store.py) ----------
+    _ARRAYS = ("offsets", "doc_ids", "tfs", "dl", "idf", "ub")
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {k: getattr(self, k) for k in self._ARRAYS}
+
+    def meta(self) -> Dict:
+        return {"vocab": self.vocab, "avgdl": self.avgdl, "n_docs": self.n_docs}
+
+    @classmethod
+    def from_arrays(cls, meta: Dict, arrays: Dict[str, np.ndarray]) -> "InvertedIndex":
+        self = cls()
+        self.vocab, self.avgdl, self.n_docs = meta["vocab"], meta["avgdl"], meta["n_docs"]
+        for k in cls._ARRAYS:
+            setattr(self, k, arrays[k])
+        return self
+
+    def _tf_part(self, tfs: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        tf = tfs.astype(np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.dl[docs] / (self.avgdl or 1.0))
+        return tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _contrib(self, tid: int, sl) -> np.ndarray:
+        """مساهمة الكلمة tid في المقاطع ضمن المدى sl من قائمتها"""
+        return self.idf[tid] * self._tf_part(self.tfs[sl], self.doc_ids[sl])
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    # ---------- الاستعلام ----------
+    def top_k(self, q_tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        tids = sorted({self.vocab[w] for w in q_tokens if w in self.vocab}, key=lambda t: -self.ub[t])
+        if not tids or k <= 0:
+            return []
+        ubs = np.array([self.ub[t] for t in tids], dtype=np.float64)
+        rest = np.concatenate([np.cumsum(ubs[::-1])[::-1], [0.0]])  # rest[i] = مجموع حدود الكلمات من i فصاعدًا
+
+        cand = np.empty(0, dtype=np.int32)
+        score = np.empty(0, dtype=np.float64)
+        theta = 0.0
+        for i, tid in enumerate(tids):
+            lo, hi = int(self.offsets[tid]), int(self.offsets[tid + 1])
+            ids = self.doc_ids[lo:hi]
+            if len(cand) >= k and rest[i] <= theta:
+                # كلمة غير أساسية: لا مرشحين جدد، نحدّث الموجودين فقط
+                pos = np.searchsorted(ids, cand)
+                pos_c = np.minimum(pos, len(ids) - 1)
+                hit = (pos < len(ids)) & (ids[pos_c] == cand)
+                if hit.any():
+                    score[hit] += self._contrib(tid, lo + pos_c[hit])
+            else:
+                # كلمة أساسية: ندمج قائمتها كاملة مع المرشحين
+                all_ids = np.concatenate([cand, ids])
+                all_sc = np.concatenate([score, self._contrib(tid, slice(lo, hi)).astype(np.float64)])
+                order = np.argsort(all_ids, kind="stable")
+                all_ids, all_sc = all_ids[order], all_sc[order]
+                starts = np.flatnonzero(np.r_[True, all_ids[1:] != all_ids[:-1]])
+                cand = all_ids[starts]
+                score = np.add.reduceat(all_sc, starts)
+            if len(cand) >= k:
+                theta = float(np.partition(score, len(score) - k)[len(score) - k])
+                # من لا يستطيع حتى مع كل الكلمات المتبقية بلوغ العتبة يُحذف
+                keep = score + rest[i + 1] >= theta
+                if not keep.all():
+                    cand, score = cand[keep], score[keep]
+
+        if len(cand) > k:
+            top = np.argpartition(-score, k - 1)[:k]
+            cand, score = cand[top], score[top]
+        order = np.lexsort((cand, -score))
+        return [(int(cand[j]), float(score[j])) for j in order]
+
+    def scores_exhaustive(self, q_tokens: Sequence[str]) -> np.ndarray:
+        """تقييم كامل لكل المقاطع (للمقارنة والاختبار فقط)"""
+        out = np.zeros(self.n_docs, dtype=np.float64)
+        for w in set(q_tokens):
+            tid = self.vocab.get(w)
+            if tid is None:
+                continue
+            lo, hi = int(self.offsets[tid]), int(self.offsets[tid + 1])
+            out[self.doc_ids[lo:hi]] += self._contrib(tid, slice(lo, hi))
+        return out
+
+    def nbytes(self) -> int:
+        return int(self.offsets.nbytes + self.doc_ids.nbytes + self.tfs.nbytes
+                   + self.dl.nbytes + self.idf.nbytes + self.ub.nbytes)
@@ -0,0 +1,177 @@
+# src/rag/pdf_ingest.py — استخراج PDF متوازٍ ومتدفق مع نقاط استئناف لكل ملف
+# - الصفحات تُستخرج على دفعات (RAG_PDF_BATCH صفحة) في مجمّع الحساب المشترك (core/compute)
+#   والنتائج تُسلَّم بالترتيب صفحةً صفحة؛ لا يُبنى نص الكتاب كاملًا في الذاكرة
+# - كل دفعة تُلحق بملف spool على القرص ثم تُحدَّث نقطة الاستئناف (الصفحة التالية + حجم spool):
+#   انقطاع الاستخراج يستأنف من آخر دفعة، وبعد الاكتمال يصبح spool كاشًا لنص الملف
+#   (لا يُعاد استخراج PDF لم يتغير mtime/حجمه عند إعادة بناء الفهارس)
+# - الملفات الصغيرة (دفعة واحدة) تُستخرج داخل العملية مباشرة بلا كلفة المجمّع
+import os, json, hashlib, threading, contextlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.rag.chunk_index import CHUNK_CHARS, CHUNK_OVERLAP, chunk_spans
+
+INGEST_DIR = os.getenv("RAG_INGEST_DIR", os.path.join("cache", "rag_ingest"))
+PDF_BATCH = int(os.getenv("RAG_PDF_BATCH", "16"))
+
+try:
+    import fcntl  # POSIX: قفل ملف بين العمليات (الرفع في العملية الرئيسية + عمال RAG_SHARDS)
+except ImportError:
+    fcntl = None
+
+_lock = threading.Lock()  # بديل fcntl: قفل واحد داخل العملية
+
+
+# -------------------- العامل --------------------
+def _extract_range(fp: str, a: int, b: int) -> List[Tuple[int, str]]:
+    """يعمل داخل عامل core/compute: نص الصفحات [a, b)"""
+    import fitz  # PyMuPDF
+    with fitz.open(fp) as doc:
+        return [(i, doc[i].get_text("text")) for i in range(a, min(b, doc.page_count))]
+
+def text_from_bytes(data: bytes, max_pages: int = 30, max_chars: int = 20000) -> str:
+    """نص PDF من الذاكرة (نتيجة بحث ويب): أول الصفحات فقط، بلا spool ولا نقاط استئناف"""
+    import fitz  # PyMuPDF
+    out, n = [], 0
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for i in range(min(max_pages, doc.page_count)):
+            t = doc[i].get_text("text")
+            out.append(t)
+            n += len(t)
+            if n >= max_chars:
+                break
+    return "\n".join(out)[:max_chars]
+
+
+# -------------------- نقاط الاستئناف --------------------
+def _paths(fp: str) -> Tuple[str, str]:
+    key = hashlib.sha1(os.path.abspath(fp).encode("utf-8")).hexdigest()
+    return os.path.join(INGEST_DIR, key + ".json"), os.path.join(INGEST_DIR, key + ".pages.jsonl")
+
+def _sig(fp: str) -> List[int]:
+    st = os.stat(fp)
+    return [st.st_mtime_ns, st.st_size]
+
+def _read_ckpt(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _write_ckpt(path: str, ck: Dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ck, f)
+    os.replace(tmp, path)
+
+@contextlib.contextmanager
+def _file_lock(ck_path: str):
+    """استخراج واحد لكل ملف في كل مرة، حتى بين العمليات"""
+    if fcntl is None:
+        with _lock:
+            yield
+        return
+    with open(ck_path + ".lock", "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def forget(fp: str) -> None:
+    """يحذف spool ونقطة الاستئناف (ملف حُذف أو يجب إعادة استخراجه)"""
+    ck_path, spool = _paths(fp)
+    for p in (ck_path, spool, ck_path + ".lock"):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+def status(fp: str) -> Dict:
+    ck = _read_ckpt(_paths(fp)[0]) or {}
+    return {"pages": ck.get("pages"), "done_pages": ck.get("next_page", 0), "done": bool(ck.get("done"))}
+
+
+# -------------------- الاستخراج --------------------
+def _extract_batches(fp: str, start: int, pages: int) -> Iterator[List[Tuple[int, str]]]:
+    if pages - start <= PDF_BATCH:
+        yield _extract_range(fp, start, pages)
+        return
+    from core import compute
+    for a in range(start, pages, PDF_BATCH):
+        yield compute.run(_extract_range, fp, a, min(a + PDF_BATCH, pages))
+
+def iter_pages(fp: str) -> Iterator[Tuple[int, str]]:
+    """(رقم الصفحة، نصها) بالترتيب؛ من spool إن وُجد ثم استخراج ما تبقّى مع حفظ التقدم"""
+    try:
+        import fitz  # PyMuPDF
+        sig = _sig(fp)
+        with fitz.open(fp) as doc:
+            pages = doc.page_count
+    except Exception:
+        return
+    ck_path, spool = _paths(fp)
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    with _file_lock(ck_path):
+        ck = _read_ckpt(ck_path)
+        try:
+            spooled = os.path.getsize(spool)
+        except OSError:
+            spooled = -1  # spool حُذف (تنظيف cache مثلًا): نقطة الاستئناف لا تساوي شيئًا بدونه
+        if not ck or ck.get("sig") != sig or ck.get("pages") != pages or spooled < ck.get("spool_bytes", 0):
+            ck = {"path": fp, "sig": sig, "pages": pages, "next_page": 0, "spool_bytes": 0, "done": False}
+            open(spool, "wb").close()
+        # ما حُفظ سابقًا (نقص ما بعد آخر نقطة استئناف = سطر نصف مكتوب)
+        with open(spool, "r+b") as f:
+            f.truncate(ck["spool_bytes"])
+            f.seek(0)
+            good, nxt = 0, 0
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    break  # سطر ممزق: نستأنف الاستخراج من بعد آخر سطر سليم
+                good, nxt = good + len(line), r["p"] + 1
+                yield r["p"], r["t"]
+            if good < ck["spool_bytes"]:
+                f.truncate(good)
+                ck.update(spool_bytes=good, next_page=nxt, done=False)
+                _write_ckpt(ck_path, ck)
+        if ck["done"]:
+            return
+        try:
+            with open(spool, "ab") as f:
+                for batch in _extract_batches(fp, ck["next_page"], pages):
+                    for i, text in batch:
+                        f.write((json.dumps({"p": i, "t": text}, ensure_ascii=False) + "\n").encode("utf-8"))
+                    f.flush()
+                    ck["next_page"] = batch[-1][0] + 1 if batch else pages
+                    ck["spool_bytes"] = f.tell()
+                    ck["done"] = ck["next_page"] >= pages
+                    _write_ckpt(ck_path, ck)
+                    yield from batch
+                if not ck["done"]:
+                    ck["next_page"], ck["done"] = pages, True
+                    _write_ckpt(ck_path, ck)
+        except Exception as e:
+            print(f"[RAG] توقف استخراج {fp} عند الصفحة {ck['next_page']}: {e}")
+
+def iter_chunks(fp: str, n: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> Iterator[Tuple[int, int, str]]:
+    """
+    مقاطع صفحةً صفحة: (بداية، نهاية، نص). الإزاحات داخل "\\n".join(الصفحات)
+    أي نفس نص read_pdf() حتى تبقى إزاحات الفهارس متسقة.
+    """
+    base = 0
+    for _, text in iter_pages(fp):
+        for s, e in chunk_spans(text, n, overlap):
+            yield base + s, base + e, text[s:e]
+        base += len(text) + 1
+
+def read_pdf(fp: str) -> str:
+    return "\n".join(text for _, text in iter_pages(fp))
+
+def ingest(fp: str) -> Dict:
+    """استخراج كامل مسبقًا (مثلًا بعد الرفع) حتى يجد الفهرس النص جاهزًا"""
+    for _ in iter_pages(fp):
+        pass
+    return status(fp)
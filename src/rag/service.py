@@ -0,0 +1,60 @@
+# src/rag/service.py — خدمة فهارس الاسترجاع المشتركة داخل العملية
+# فهرس واحد لكل مدونة يُبنى مرة ويُحدَّث عند تغيّر mtime للملفات:
+#   "docs" → مجلدا DOCS_DIR و UPLOADS_DIR (retriever)
+#   "data" → مجلدا data/ و knowledge/ (omni_brain و core/rag_local)
+# RAG_BACKEND: memory (BM25 داخل الذاكرة، chunk_index.py) | fts (SQLite FTS5 على القرص، fts_store.py)
+# RAG_SHARDS=N (مع memory): "docs" مقسّم على N عملية عاملة (shards.py) بنفس الواجهة
+import os
+import threading
+from typing import Dict, List
+
+from src.rag.chunk_index import ChunkIndex, TEXT_PATTERNS
+
+DOCS_DIR = os.getenv("DOCS_DIR", "docs")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", "knowledge")  # ما يحفظه core/services/learning.py
+BACKEND = os.getenv("RAG_BACKEND", "memory").strip().lower()
+SHARDS = int(os.getenv("RAG_SHARDS", "0"))
+
+# (المجلدات، الأنماط، أسطر محسوبة مسبقًا للمقتطفات)
+_SPECS = {
+    "docs": ([DOCS_DIR, UPLOADS_DIR], TEXT_PATTERNS, False),
+    "data": ([DATA_DIR, KNOWLEDGE_DIR], ("*.md", "*.txt"), True),
+}
+
+_INDEXES: Dict[str, ChunkIndex] = {}
+_LOCK = threading.Lock()
+
+def get_index(name: str) -> ChunkIndex:
+    """الفهرس المشترك بالاسم (يُنشأ كسولًا؛ البناء نفسه عند أول استعلام)"""
+    with _LOCK:
+        idx = _INDEXES.get(name)
+        if idx is None:
+            roots, patterns, passages = _SPECS[name]
+            cls = ChunkIndex
+            if BACKEND == "memory" and name == "docs" and SHARDS > 0:
+                from src.rag.shards import ShardedIndex
+                idx = _INDEXES[name] = ShardedIndex(name, SHARDS, roots, patterns, passages=passages)
+                return idx
+            if BACKEND == "fts":
+                from src.rag.fts_store import FtsIndex as cls
+            idx = _INDEXES[name] = cls(name, roots, patterns, passages=passages)
+        return idx
+
+def query(name: str, q: str, top_k: int = 4) -> List[Dict]:
+    return get_index(name).query(q, top_k=top_k)
+
+def watched_roots() -> List[str]:
+    return sorted({r for roots, *_ in _SPECS.values() for r in roots})
+
+def refresh_all() -> Dict[str, Dict]:
+    """يطبّق تغييرات الملفات على كل فهرس أُنشئ حتى الآن (الباقي يُبنى عند أول استعلام)"""
+    with _LOCK:
+        indexes = list(_INDEXES.items())
+    return {name: idx.refresh() for name, idx in indexes}
+
+def stats() -> Dict[str, Dict]:
+    with _LOCK:
+        indexes = list(_INDEXES.items())
+    return {name: idx.stats() for name, idx in indexes}
@@ -0,0 +1,158 @@
+# src/rag/shards.py — فهرس مقسّم على عمليات عاملة (scatter-gather) بمهلة ونتائج جزئية
+# - RAG_SHARDS=N: ملفات المدونة تُوزَّع على N قطعة بحسب crc32(المسار) % N (توزيع ثابت)
+#   وكل قطعة ChunkIndex مستقل (لقطته الخاصة على القرص) داخل عملية خاصة به؛
+#   ذاكرة كل عملية تتبع حجم قطعتها لا حجم المدونة كلها
+# - المنسّق يرسل السؤال لكل القطع، ويدمج أفضل k من كل منها بالدرجة، ولا ينتظر أكثر من
+#   RAG_SHARD_DEADLINE_MS: القطع المتأخرة تُسجَّل في missing والنتيجة partial=True
+# - idf محلي لكل قطعة؛ مع التوزيع العشوائي للملفات تبقى الدرجات متقاربة بما يكفي للدمج
+# - عامل مات يُعاد تشغيله تلقائيًا عند الاستعلام التالي
+import os, threading, time, zlib, itertools
+from typing import Dict, List, Optional, Sequence
+
+from src.rag.chunk_index import ChunkIndex, TEXT_PATTERNS
+
+SHARDS = int(os.getenv("RAG_SHARDS", "0"))
+DEADLINE_MS = float(os.getenv("RAG_SHARD_DEADLINE_MS", "800"))
+
+
+def shard_of(path: str, n: int) -> int:
+    return zlib.crc32(os.path.normpath(path).encode("utf-8")) % n
+
+
+class ShardIndex(ChunkIndex):
+    """ChunkIndex يرى فقط ملفات قطعته"""
+
+    def __init__(self, name: str, shard: int, n: int, roots: Sequence[str],
+                 patterns: Sequence[str] = TEXT_PATTERNS, passages: bool = False):
+        super().__init__(f"{name}.s{shard}of{n}", roots, patterns, passages=passages)
+        self.shard, self.n = shard, n
+
+    def list_files(self) -> List[str]:
+        return [f for f in super().list_files() if shard_of(f, self.n) == self.shard]
+
+
+# -------------------- العامل --------------------
+def _serve(name, shard, n, roots, patterns, passages, req_q, resp_q) -> None:
+    idx = ShardIndex(name, shard, n, roots, patterns, passages)
+    while True:
+        msg = req_q.get()
+        if msg is None:
+            return
+        op, rid, args = msg
+        try:
+            if op == "query":
+                out = idx.query(*args)
+            elif op == "len":
+                out = len(idx)
+            elif op == "refresh":
+                out = idx.refresh()
+            else:
+                out = idx.stats()
+            resp_q.put((rid, shard, out, None))
+        except Exception as e:
+            resp_q.put((rid, shard, None, f"{type(e).__name__}: {e}"))
+
+
+# -------------------- المنسّق --------------------
+class ShardedIndex:
+    def __init__(self, name: str, n: int, roots: Sequence[str], patterns: Sequence[str] = TEXT_PATTERNS,
+                 passages: bool = False):
+        self.name, self.n = name, n
+        self._spec = (list(roots), tuple(patterns), passages)
+        self._lock = threading.Lock()
+        self._procs: List = [None] * n
+        self._reqs: List = [None] * n
+        self._resp = None
+        self._ctx = None
+        self._ids = itertools.count()
+        self._waiting: Dict[int, Dict] = {}
+        self.stats_ = {"queries": 0, "partial": 0, "restarts": 0}
+
+    # ---------- دورة حياة العمال ----------
+    def start(self) -> None:
+        import multiprocessing as mp
+        with self._lock:
+            if self._ctx is None:
+                self._ctx = mp.get_context("spawn")  # الخادم متعدد الخيوط: fork غير آمن
+                self._resp = self._ctx.Queue()
+                threading.Thread(target=self._dispatch, name=f"rag-shards-{self.name}", daemon=True).start()
+            for k in range(self.n):
+                p = self._procs[k]
+                if p is not None and p.is_alive():
+                    continue
+                if p is not None:
+                    self.stats_["restarts"] += 1
+                self._reqs[k] = self._ctx.Queue()
+                p = self._ctx.Process(target=_serve, args=(self.name, k, self.n, *self._spec, self._reqs[k], self._resp),
+                                      name=f"rag-shard-{self.name}-{k}", daemon=True)
+                p.start()
+                self._procs[k] = p
+
+    def stop(self) -> None:
+        with self._lock:
+            for q, p in zip(self._reqs, self._procs):
+                if p is not None and p.is_alive():
+                    q.put(None)
+            self._procs = [None] * self.n
+
+    def _dispatch(self) -> None:
+        while True:
+            rid, shard, out, err = self._resp.get()
+            with self._lock:
+                w = self._waiting.get(rid)
+                if w is None:
+                    continue  # رد متأخر بعد انتهاء المهلة
+                w["replies"][shard] = (out, err)
+                if len(w["replies"]) == self.n:
+                    w["done"].set()
+
+    def _broadcast(self, op: str, args: tuple, deadline_s: float) -> Dict[int, tuple]:
+        self.start()
+        rid = next(self._ids)
+        w = {"replies": {}, "done": threading.Event()}
+        with self._lock:
+            self._waiting[rid] = w
+        for q in self._reqs:
+            q.put((op, rid, args))
+        w["done"].wait(deadline_s)
+        with self._lock:
+            self._waiting.pop(rid, None)
+            return dict(w["replies"])
+
+    # ---------- الواجهة ----------
+    def search(self, query: str, top_k: int = 4, snippets: bool = False, deadline_ms: Optional[float] = None) -> Dict:
+        """{hits, partial, missing, errors, latency_ms} — hits بنفس شكل ChunkIndex.query"""
+        t0 = time.perf_counter()
+        replies = self._broadcast("query", (query, top_k, snippets), (deadline_ms or DEADLINE_MS) / 1000.0)
+        hits, errors = [], {}
+        for shard, (out, err) in replies.items():
+            if err:
+                errors[shard] = err
+            else:
+                hits.extend(out)
+        hits.sort(key=lambda h: -h["score"])
+        missing = [k for k in range(self.n) if k not in replies]
+        self.stats_["queries"] += 1
+        if missing or errors:
+            self.stats_["partial"] += 1
+        return {"hits": hits[:top_k], "partial": bool(missing or errors), "missing": missing, "errors": errors,
+                "latency_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+    def query(self, query: str, top_k: int = 4, snippets: bool = False) -> List[Dict]:
+        return self.search(query, top_k, snippets)["hits"]
+
+    def refresh(self) -> Dict:
+        """نفس مفاتيح ChunkIndex.refresh مجموعة على القطع (يستعملها watcher.py)"""
+        out = {"files": 0, "chunks": 0, "delta_files": 0, "delta_chunks": 0, "masked": 0}
+        for st, _ in self._broadcast("refresh", (), 60.0).values():
+            for k in out:
+                out[k] += (st or {}).get(k, 0)
+        return {**self.stats(), **out}
+
+    def stats(self) -> Dict:
+        alive = sum(1 for p in self._procs if p is not None and p.is_alive())
+        return {"backend": "shards", "shards": self.n, "alive": alive, **self.stats_}
+
+    def __len__(self) -> int:
+        """عدد المقاطع فيما ردّ ضمن مهلة الاستعلام (قطعة تُقلع الآن لا تحجب المستدعي دقيقة)"""
+        return sum(out or 0 for out, _ in self._broadcast("len", (), DEADLINE_MS / 1000.0).values())
@@ -0,0 +1,92 @@
+# src/rag/text_store.py — تخزين النصوص والمصفوفات في ملفات تُقرأ عبر mmap
+# بدل قوائم str داخل كل عامل: الصفحات تُشارك عبر ذاكرة نظام التشغيل (page cache)
+# ولا تُقرأ من القرص إلا الصفحات التي يلمسها الاستعلام فعلًا.
+#   - write_blob/open_blob: عدة مصفوفات NumPy في ملف واحد (محاذاة 64 بايت) + وصف مواضعها
+#   - TextStore: نصوص المقاطع كـ UTF-8 متتالي + جدول إزاحات int64
+#   - LineStore: ملف JSONL (سطر لكل رقم) مع جدول بدايات الأسطر
+import json, mmap, os
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+Layout = Dict[str, Tuple[str, Tuple[int, ...], int]]  # الاسم → (dtype، الشكل، الإزاحة)
+
+
+def write_blob(path: str, arrays: Dict[str, np.ndarray]) -> Layout:
+    layout: Layout = {}
+    with open(path, "wb") as f:
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            pad = -f.tell() % 64
+            f.write(b"\0" * pad)
+            layout[name] = (arr.dtype.str, tuple(arr.shape), f.tell())
+            f.write(arr.tobytes())
+    return layout
+
+
+def open_blob(path: str, layout: Layout) -> Dict[str, np.ndarray]:
+    """مصفوفات للقراءة فقط فوق mmap واحد (لا نسخ)"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    out = {}
+    for name, (dt, shape, off) in layout.items():
+        dtype = np.dtype(dt)
+        count = int(np.prod(shape)) if shape else 1
+        out[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=off).reshape(shape)
+    return out
+
+
+def pack_texts(texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(بايتات UTF-8 متتالية، إزاحات int64 بطول n+1)"""
+    parts: List[bytes] = [t.encode("utf-8") for t in texts]
+    off = np.zeros(len(parts) + 1, dtype=np.int64)
+    if parts:
+        np.cumsum([len(p) for p in parts], out=off[1:])
+    return np.frombuffer(b"".join(parts), dtype=np.uint8), off
+
+
+class TextStore:
+    """قائمة نصوص للقراءة فقط: store[i] يفك ترميز مقطع واحد عند الطلب"""
+    __slots__ = ("_data", "_off")
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._off = offsets
+
+    def __len__(self) -> int:
+        return len(self._off) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._data[int(self._off[i]):int(self._off[i + 1])].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def nbytes(self) -> int:
+        return int(self._data.nbytes + self._off.nbytes)
+
+
+class LineStore:
+    """ملف JSONL للقراءة عبر mmap: store[i] = json السطر i (أو None خارج المدى)
+    الكاتب يضيف في آخر الملف أو يستبدله (os.replace) ولا يقطعه أبدًا: قطع ملف مفتوح بـ mmap ← SIGBUS"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except OSError:
+            self._mm = b""
+        buf = np.frombuffer(self._mm, dtype=np.uint8) if len(self._mm) else np.zeros(0, dtype=np.uint8)
+        ends = np.flatnonzero(buf == 10) + 1
+        self._starts = np.concatenate([[0], ends]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self._starts) - 1
+
+    def get(self, i: int):
+        if i < 0 or i >= len(self):
+            return None
+        return json.loads(self._mm[int(self._starts[i]):int(self._starts[i + 1])])
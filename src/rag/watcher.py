@@ -0,0 +1,70 @@
+# src/rag/watcher.py — مراقبة docs/ و data/ و uploads/ وتطبيق التغييرات على الفهارس فورًا
+# - watchdog (inotify على لينكس) إن كان مثبتًا: إشعار لحظي ثم تهدئة قصيرة لتجميع الكتابات
+# - وإلا استطلاع كل RAG_WATCH_SECS ثانية (stat للملفات فقط؛ لا قراءة محتوى)
+# كل تغيير يُطبَّق كدلتا لكل ملف (ChunkIndex.refresh) دون إعادة تشغيل أو بناء كامل.
+import os, threading, time
+from typing import Optional
+
+from src.rag import service
+
+WATCH_SECS = float(os.getenv("RAG_WATCH_SECS", "2"))
+DEBOUNCE_SECS = float(os.getenv("RAG_WATCH_DEBOUNCE", "0.5"))
+
+_thread: Optional[threading.Thread] = None
+_changed = threading.Event()
+
+
+def _refresh() -> None:
+    try:
+        for name, st in service.refresh_all().items():
+            if st["delta_files"] or st["masked"]:
+                print(f"[RAG] {name}: +{st['delta_chunks']} مقطع من {st['delta_files']} ملف، {st['masked']} محجوب")
+    except Exception as e:
+        print(f"[RAG] فشل تحديث الفهارس: {e}")
+
+
+def _start_observer() -> bool:
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except Exception:
+        return False
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            _changed.set()
+
+    obs = Observer()
+    obs.daemon = True
+    watched = 0
+    for root in service.watched_roots():
+        if os.path.isdir(root):
+            obs.schedule(_Handler(), root, recursive=True)
+            watched += 1
+    if not watched:
+        return False
+    obs.start()
+    return True
+
+
+def _loop(notified: bool) -> None:
+    while True:
+        if notified:
+            # احتياط: فحص كامل كل دقيقة حتى لو فات إشعار (مجلد أُنشئ لاحقًا مثلًا)
+            _changed.wait(60)
+            time.sleep(DEBOUNCE_SECS)
+            _changed.clear()
+        else:
+            time.sleep(WATCH_SECS)
+        _refresh()
+
+
+def start() -> str:
+    """يبدأ المراقب مرة واحدة لكل عملية؛ يعيد الوضع المستخدم"""
+    global _thread
+    if _thread is not None:
+        return _thread.name
+    notified = _start_observer()
+    _thread = threading.Thread(target=_loop, args=(notified,), name="rag-watch-" + ("notify" if notified else "poll"), daemon=True)
+    _thread.start()
+    return _thread.name
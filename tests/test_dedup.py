@@ -0,0 +1,54 @@
+# tests/test_dedup.py — تقدير MinHash لتشابه Jaccard مقابل القيمة الدقيقة
+import random
+
+import numpy as np
+
+from src.rag.dedup import NUM_PERM, Deduper, THRESHOLD, _shingles, signature
+
+_VOCAB = [f"w{i}" for i in range(500)]
+
+
+def _pair(keep: float, n: int = 300, seed: int = 0):
+    rnd = random.Random(seed)
+    base = [rnd.choice(_VOCAB) for _ in range(n)]
+    other = [w if rnd.random() < keep else rnd.choice(_VOCAB) for w in base]
+    return " ".join(base), " ".join(other)
+
+
+def _exact(a: str, b: str) -> float:
+    sa, sb = set(_shingles(a).tolist()), set(_shingles(b).tolist())
+    return len(sa & sb) / len(sa | sb)
+
+
+def _estimate(a: str, b: str) -> float:
+    return float(np.mean(signature(a) == signature(b)))
+
+
+def test_estimate_tracks_exact_jaccard():
+    # 64 دالة → انحراف معياري ≤ 0.5/8؛ نسمح بثلاثة أضعافه تقريبًا
+    for seed, keep in enumerate((0.0, 0.3, 0.6, 0.8, 0.9, 0.95, 1.0)):
+        a, b = _pair(keep, seed=seed)
+        assert abs(_estimate(a, b) - _exact(a, b)) <= 0.2, (keep, _exact(a, b), _estimate(a, b))
+
+
+def test_unrelated_texts_are_not_duplicates():
+    for seed in range(20):
+        a, b = _pair(0.2, seed=100 + seed)
+        assert _exact(a, b) < 0.1
+        assert _estimate(a, b) < 0.3
+
+
+def test_deduper_flags_only_near_duplicates():
+    a, near = _pair(0.99, seed=7)
+    _, far = _pair(0.5, seed=7)
+    assert _exact(a, near) >= THRESHOLD and _exact(a, far) < 0.5
+    dd = Deduper()
+    assert dd.check(0, a) is None
+    assert dd.check(1, far) is None
+    assert dd.check(2, near) == 0
+    assert dd.report()["dup_chunks"] == 1
+
+
+def test_signature_shape_and_empty_text():
+    assert signature("") is None
+    assert signature("كلمة واحدة فقط هنا").shape == (NUM_PERM,)